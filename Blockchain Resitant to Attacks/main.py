@@ -1,417 +1,522 @@
 import argparse
+from contextlib import nullcontext
 from utils.utils import generate_network, print_graph
 from utils.generators import ExponentialDist, getHashDist
-from utils.definitions import Event, Block, EventList
-import networkx as nx
-import matplotlib.pyplot as plt
-from utils.definitions import blockId, total_blocks
+from utils.definitions import Event, TX_GEN, TX_REC, BLK_GEN, BLK_REC, INV_REC, GETDATA_REC, EVENT_NAMES, RELAY_MODES
+import numpy as np
+from utils.context import SimulationContext
+from utils.trace import TraceWriter
+from utils.metrics import ChainMetrics
+from utils import arrivals
+from utils import render
+from utils import profiling
+from utils import termination
+from utils.checkpoint import saveCheckpoint, loadCheckpoint
 import os 
-from networkx.drawing.nx_agraph import write_dot, graphviz_layout
-import warnings
-warnings.filterwarnings("ignore", message="More than 20 figures have been opened*")
 
 
 '''
 Simulator class to simulate the cryptocurrency network
 Contains the following functions:
 Peers: list of peers in the network
-Graph: Graph of the network
+Graph: Adjacency of the network in CSR form (indptr, indices)
 TtxDist: Transaction inter-arrival time distribution
 honestHash: Hash power distribution of honest peers
 att_hash_1: Hash power distribution of selfish miner 1
 att_hash_2: Hash power distribution of selfish miner 2
-sim_Time: Simulation time
-stop_condition: Emptying the EventList after the 2*n blocks are mined
+sim_Time: Simulated time after which the run stops, None to run until the other stop conditions
+stop_condition: Emptying the EventList after the 2*n blocks are mined, see drain
+ctx: SimulationContext holding the event queue, ID counters and random generators of this run
+trace: path of the binary event trace, None to disable it
+relay: relay mode of blocks and transactions, one of RELAY_MODES
+stop_when: extra termination predicates (utils.termination), the run stops at the first one that fires
+log_transactions: write the transaction logs in ./observations/Transactions, by default only when the events are saved
+confirmation_depth: depth in the longest chain at which the peers forget the transactions of a block
+stopped_by: why the last run stopped, the name of the predicate, "block_limit" or "empty" once the EventList ran out
 '''
 
 
 class Simulator:
-    def __init__(self, n, z0,  ttx, I, hash_selfish, sim_Time = 5000, save_Events = False, stop_condition = False):
+    def __init__(self, n, z0,  ttx, I, hash_selfish, sim_Time = None, save_Events = False, stop_condition = False, ctx = None, trace = None, relay = "full", stop_when = (), log_transactions = None, confirmation_depth = 6):
         '''
         zo = 50 % of honest are slow 
         z1 = same for all honest peers 
         '''
 
+        self.ctx = ctx if ctx is not None else SimulationContext()
         self.n = n
-        self.Peers, self.Graph = generate_network(n, z0, 100)
-        self.TtxDist = ExponentialDist(ttx)
-        self.honestHash = getHashDist(self.Peers, I, hash_selfish)
+        self.Peers, self.Graph = generate_network(self.ctx, n, z0, 100)
+        # the blocks of the 2 selfish miners are counted on the chain of every peer for their MPU
+        self.ctx.chain_metrics = ChainMetrics(self.ctx.blocks, n, watched=(0, 1))
+        self.TtxDist = ExponentialDist(ttx, self.ctx.spawnRng())
+        self.honestHash = getHashDist(self.Peers, I, hash_selfish, self.ctx)
 
 
-        self.att_hash_1 = ExponentialDist(I/hash_selfish[0])
-        self.att_hash_2 = ExponentialDist(I/hash_selfish[1])
+        self.att_hash_1 = ExponentialDist(I/hash_selfish[0], self.ctx.spawnRng())
+        self.att_hash_2 = ExponentialDist(I/hash_selfish[1], self.ctx.spawnRng())
         self.sim_Time = sim_Time
+        predicates = list(stop_when)
+        if sim_Time is not None:
+            predicates.append(termination.SimTime(sim_Time))
+        self.termination = termination.AnyOf(predicates)
+        self.stopped_by = None
         self.Block_Limit = 2 * n 
         self.save_Events = save_Events
+        self.ctx.log_transactions = save_Events if log_transactions is None else log_transactions
+        if trace is not None:
+            self.ctx.trace = TraceWriter(trace)
+        if relay not in RELAY_MODES:
+            raise ValueError(f"relay must be one of {RELAY_MODES}, got {relay!r}")
+        self.ctx.relay_mode = relay
+        self.ctx.confirmation_depth = confirmation_depth
         self.stop_condition = stop_condition
+        self.seeded = False
+        # handler table indexed by the integer event code, shared by the main and the drain loop
+        self.handlers = self.handlerTable()
 
         # Last 2 peers are selfish miners
     
 
+    def handlerTable(self):
+        return (self.handleTransactionGen, self.handleTransactionRec, self.handleBlockGen, self.handleBlockRec, self.handleInvRec, self.handleGetDataRec)
+
+    def __getstate__(self):
+        # bound methods are not saved, the handler table is rebuilt on load
+        state = self.__dict__.copy()
+        del state["handlers"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.handlers = self.handlerTable()
+
+    def checkpoint(self, path):
+        '''
+        Save the state of the run to path, Simulator.resume(path) gives back a Simulator
+        whose simulate() continues the run exactly where it stopped.
+        '''
+        saveCheckpoint(self, path)
+
+    @staticmethod
+    def resume(path):
+        '''
+        Load a run saved by checkpoint.
+        '''
+        return loadCheckpoint(path)
+
     def outputEvent(self, event):
         '''
         output the event to the respective file
         '''
 
-        if event.event_type == "Transaction_Gen":
+        event_type = event.event_type
+        if event_type == TX_GEN:
             # output print to sender.txt 
-            with open(f'./observations/Events/peer_{event.sender.unique_id}.txt', 'a') as f:
-                f.write(f"{event.timestamp} {event.event_type} sender = {event.sender.unique_id}  \n")
-        elif event.event_type == "Transaction_Rec":
-            with open(f'./observations/Events/peer_{event.receiver.unique_id}.txt', 'a') as f:
-                f.write(f"{event.timestamp} {event.event_type} {event.receiver.unique_id} {event.txn.txid} {event.txn.amount} Transaction from {event.txn.peer1.unique_id} to {event.txn.peer2.unique_id} \n")
-        elif event.event_type == "Block_Gen":
-            with open(f'./observations/Events/peer_{event.generator.unique_id}.txt', 'a') as f:
-                f.write(f"{event.timestamp} {event.event_type} {event.generator.unique_id} \n")
-        elif event.event_type == "Block_Rec":
-            with open(f'./observations/Events/peer_{event.receiver.unique_id}.txt', 'a') as f:
-                f.write(f"{event.timestamp} {event.event_type} {event.receiver.unique_id} {event.block.id} \n")
+            peer = event.sender
+            line = f"{event.timestamp} {EVENT_NAMES[event_type]} sender = {event.sender.unique_id}  \n"
+        elif event_type == TX_REC:
+            peer = event.receiver
+            line = f"{event.timestamp} {EVENT_NAMES[event_type]} {event.receiver.unique_id} {event.txn.txid} {event.txn.amount} Transaction from {event.txn.peer1.unique_id} to {event.txn.peer2.unique_id} \n"
+        elif event_type == BLK_GEN:
+            peer = event.generator
+            line = f"{event.timestamp} {EVENT_NAMES[event_type]} {event.generator.unique_id} \n"
+        elif event_type == BLK_REC:
+            peer = event.receiver
+            line = f"{event.timestamp} {EVENT_NAMES[event_type]} {event.receiver.unique_id} {event.block.id} \n"
+        elif event_type == INV_REC or event_type == GETDATA_REC:
+            peer = event.receiver
+            item = f"Transaction {event.txn.txid}" if event.txn is not None else f"Block {event.block.id}"
+            line = f"{event.timestamp} {EVENT_NAMES[event_type]} {event.receiver.unique_id} {item} from {event.sender.unique_id} \n"
+        self.ctx.output.write(f'./observations/Events/peer_{peer.unique_id}.txt', line)
         
             
-
-    def simulate(self):
+    # Event handlers, stop is True while draining the EventList after the 2*n blocks are mined.
+    def handleTransactionGen(self, event, stop=False):
+        if stop:
+            return
+        delta_t = self.TtxDist()
+        event.sender.createTransaction(event, delta_t)
+
+    def handleTransactionRec(self, event, stop=False):
+        if stop:
+            return
+        event.receiver.receiveTransaction(event)
+
+    def handleBlockGen(self, event, stop=False):
         '''
-        Simulate the cryptocurrency network with 2 selfish Miners 
-        
+        Returns True once the generator's BlockChain reached Block_Limit, which stops the main loop.
+        While draining only the selfish miners act, releasing their hidden blocks.
+        '''
+        if stop:
+            if event.generator.peer_type != "honest":
+                event.generator.createBlock(event, None, stop=True)
+            return
+        if event.generator.blockchain.bcTree.size() >=  self.Block_Limit:
+            return True
+        if event.generator.peer_type == "selfish1":
+            delta_t = self.att_hash_1()
+        elif event.generator.peer_type == "selfish2":
+            delta_t = self.att_hash_2()
+        # elif event.generator.low_CPU:
+        #     delta_t = self.lowHash()
+        else :
+            delta_t = self.honestHash()
+        event.generator.createBlock(event, delta_t)
+
+    def handleBlockRec(self, event, stop=False):
+        event.receiver.receiveBlock(event, stop=stop)
+
+    def handleInvRec(self, event, stop=False):
+        event.receiver.receiveInv(event)
+
+    def handleGetDataRec(self, event, stop=False):
+        event.receiver.receiveGetData(event)
+
+    def seedEvents(self):
+        '''
+        Schedule the first transaction and the first block of every peer.
         '''
+        EventList = self.ctx.EventList
 
         # Add 1st transaction for each peer 
         for i in range(self.n):
             timeStamp = self.TtxDist()
-            EventList.put((timeStamp,Event(timeStamp, "Transaction_Gen", sender=self.Peers[i])))
-        
+            EventList.push(timeStamp, Event(timeStamp, TX_GEN, sender=self.Peers[i]))
+    
         # first block 
         for i in range(self.n):
             # check if self.Peers[i] has prefix of selfish 
             if self.Peers[i].peer_type == "selfish1":
                 timeStamp = self.att_hash_1()
-                EventList.put((timeStamp,Event(timeStamp, "Block_Gen", generator=self.Peers[i])))
+                EventList.push(timeStamp, Event(timeStamp, BLK_GEN, generator=self.Peers[i]))
             elif self.Peers[i].peer_type == "selfish2":
                 timeStamp = self.att_hash_2()
-                EventList.put((timeStamp,Event(timeStamp, "Block_Gen", generator=self.Peers[i])))
+                EventList.push(timeStamp, Event(timeStamp, BLK_GEN, generator=self.Peers[i]))
             # elif self.Peers[i].low_CPU:
             #     timeStamp = self.lowHash()
-            #     EventList.put((timeStamp,Event(timeStamp, "Block_Gen", generator=self.Peers[i])))
+            #     EventList.push(timeStamp, Event(timeStamp, BLK_GEN, generator=self.Peers[i]))
             else:
                 timeStamp = self.honestHash()
-                EventList.put((timeStamp,Event(timeStamp, "Block_Gen", generator=self.Peers[i])))
-        
-
-        # Until the event list is empty or BlockChain size is less than 20
-        while not EventList.empty():
-            time, event = EventList.get()
-            # self.outputEvent(event)
-            # if time > self.sim_Time:
-                # break
-
-            # check for the type event.event_type using case 
-            if self.save_Events:
-                self.outputEvent(event)
-            if event.event_type == "Transaction_Gen":
-                delta_t = self.TtxDist()
-                event.sender.createTransaction(event, delta_t)
-            elif event.event_type == "Transaction_Rec":
-                event.receiver.receiveTransaction(event)
-            elif event.event_type == "Block_Gen":
-                if event.generator.blockchain.bcTree.size() >=  self.Block_Limit:
-                    break
-                if event.generator.peer_type == "selfish1":
-                    delta_t = self.att_hash_1()
-                elif event.generator.peer_type == "selfish2":
-                    delta_t = self.att_hash_2()
-                # elif event.generator.low_CPU:
-                #     delta_t = self.lowHash()
-                else :
-                    delta_t = self.honestHash()
-                event.generator.createBlock(event, delta_t)
-            elif event.event_type == "Block_Rec":
-                event.receiver.receiveBlock(event)
-        
-
-        # Empty the EventList after the 2*n blocks are mined
-        while not EventList.empty() and self.stop_condition: 
-            time, event = EventList.get()
+                EventList.push(timeStamp, Event(timeStamp, BLK_GEN, generator=self.Peers[i]))
 
-            if self.save_Events:
-                self.outputEvent(event)
-            if event.event_type == "Transaction_Gen":
-                continue
-            elif event.event_type == "Transaction_Rec":
-                continue
-            elif event.event_type == "Block_Gen":
-                if event.generator.peer_type == "selfish1":
-                    delta_t = self.att_hash_1()
-                elif event.generator.peer_type == "selfish2":
-                    delta_t = self.att_hash_2()
-                # elif event.generator.low_CPU:
-                #     delta_t = self.lowHash()
-                else :
-                    delta_t = self.honestHash()
-                    continue
-                event.generator.createBlock(event, delta_t, stop =True)
-            elif event.event_type == "Block_Rec":
-                event.receiver.receiveBlock(event, stop=True)
-
-
-    def drawBlockChains(self, save=False):
+    def simulate(self, checkpoint = None, checkpoint_every = 1000000):
         '''
-        Draw the blockchains of all the peers
+        Simulate the cryptocurrency network with 2 selfish Miners 
+        A stopped or resumed run continues from its EventList, a run that reached the block limit stays finished.
+        simulate never drains the EventList, however the run stopped, see drain.
+        checkpoint: path the run is saved to every checkpoint_every events, None to not save it
         '''
-        for i in range(self.n):
-            plt.figure()
-            nx.draw(self.Peers[i].blockchain.bcTree, pos=nx.planar_layout(self.Peers[i].blockchain.bcTree), node_size=200, node_color='blue', with_labels=True)
-            
 
-            if save:
-                plt.savefig(f'./observations/BlockChains/bc_{i}.png')
-            else:
-                plt.show()
+        if self.stopped_by == "block_limit":
+            # the run already reached its block limit, e.g. resumed from its final checkpoint
+            return
+        try:
+            EventList = self.ctx.EventList
+            if not self.seeded:
+                self.seedEvents()
+                self.seeded = True
+
+            # Until the event list is empty or BlockChain size is less than 20
+            handlers = self.handlers
+            trace = self.ctx.trace
+            if trace is not None:
+                trace.open()
+            stop = self.termination if self.termination.predicates else None
+            self.termination.start(self)
+            self.stopped_by = "empty"
+            until_checkpoint = checkpoint_every
+            while EventList:
+                if checkpoint is not None:
+                    until_checkpoint -= 1
+                    if until_checkpoint == 0:
+                        self.checkpoint(checkpoint)
+                        until_checkpoint = checkpoint_every
+                time, event = EventList.pop()
+                if stop is not None and stop(time, event):
+                    # leave the event unhandled in the EventList
+                    EventList.push(time, event)
+                    self.stopped_by = stop.fired.name
+                    break
 
-            plt.close() 
-            plt.figure()
-            nx.draw(self.Peers[i].blockchain.bcTree, pos=nx.kamada_kawai_layout(self.Peers[i].blockchain.bcTree), node_size=200, node_color='blue', with_labels=True)
-            if save:
-                plt.savefig(f'./observations/BlockChains/bc_kkl_{i}.png')
-            plt.close() 
+                if self.save_Events:
+                    self.outputEvent(event)
+                if trace is not None:
+                    trace.record(event)
+                if handlers[event.event_type](event):
+                    self.stopped_by = "block_limit"
+                    break
+            else:
+                # the EventList ran out, the last event may still have met a stop condition
+                if stop is not None and stop.finish():
+                    self.stopped_by = stop.fired.name
 
+        finally:
+            # flush and close all the observation files
+            self.ctx.output.close()
+            if self.ctx.trace is not None:
+                self.ctx.trace.close()
 
-    def drawChain(self, unique_id, save=False):
+    def drain(self):
         '''
-        Draw the blockChain of single Peer 
+        Empty the EventList after the 2*n blocks are mined, when stop_condition is set.
+        Only the selfish miners act while draining, releasing their hidden blocks.
+        Draining ends the run, so it is done once by whoever reports its results (main.py, sweep.py),
+        after simulate returns and after the run is checkpointed, a stopped run is kept paused until then.
+        '''
+        EventList = self.ctx.EventList
+        handlers = self.handlers
+        trace = self.ctx.trace
+        try:
+            if trace is not None:
+                trace.open()
+            while EventList and self.stop_condition: 
+                time, event = EventList.pop()
+
+                if self.save_Events:
+                    self.outputEvent(event)
+                if trace is not None:
+                    trace.record(event)
+                handlers[event.event_type](event, True)
+        finally:
+            self.ctx.output.close()
+            if self.ctx.trace is not None:
+                self.ctx.trace.close()
+
+
+    def chainJob(self, unique_id):
         '''
-        i = unique_id
-        plt.figure()
-        pos = graphviz_layout(self.Peers[i].blockchain.bcTree, prog="dot")
+        Edges, labels and node colours of the blockChain of a single Peer, as drawn by utils.render
+        '''
+        bcTree = self.Peers[unique_id].blockchain.bcTree
         # for each label add its creator id 
         labels = {}
-        for node in self.Peers[i].blockchain.bcTree.nodes():
+        for node in bcTree.nodes():
             if node == 0:
                 labels[node] = "Genesis"
             else:
-                labels[node] = f"Peer_{self.Peers[i].blockchain.id2blk[node].creator.unique_id}, {node}"
-
-        pos = nx.nx_agraph.graphviz_layout(self.Peers[i].blockchain.bcTree, prog="dot")
-        # Create new graph with lables as nodes and nodes present in the blockchain as edges
-        tempGraph = nx.DiGraph()
-        # for edge in self.Peers[i].blockchain.bcTree.edges():
-        #     tempGraph.add_edge(labels[edge[0]], labels[edge[1]])
-        # write_dot(tempGraph, f'./observations/BlockChains/bc_{i}.dot')
-        # Define colors for nodes with specific prefixes
-        prefix_colors = {
-            "Peer_0,": "blue",
-            "Peer_1,": "red"
-        }
-
-        for edge in self.Peers[i].blockchain.bcTree.edges():
-            source_label = labels[edge[0]]
-            target_label = labels[edge[1]]
-            
-            # Check if the source node label starts with specified prefixes
-            for prefix, color in prefix_colors.items():
-                if source_label.startswith(prefix):
-                    tempGraph.add_node(source_label, color=color)
-                    break
-                    
-            # Check if the target node label starts with specified prefixes
-            for prefix, color in prefix_colors.items():
-                if target_label.startswith(prefix):
-                    tempGraph.add_node(target_label, color=color)
-                    break
-            
-            tempGraph.add_edge(source_label, target_label)
+                labels[node] = f"Peer_{self.ctx.blocks[node].creator.unique_id}, {node}"
+        # Define colors for the blocks of the selfish miners
+        selfish_colors = {0: "blue", 1: "red"}
+        colors = {}
+        for node in labels:
+            if node != 0 and self.ctx.blocks[node].creator.unique_id in selfish_colors:
+                colors[node] = selfish_colors[self.ctx.blocks[node].creator.unique_id]
+        return (unique_id, bcTree.edges(), labels, colors)
+
+    def drawBlockChains(self, mode="png", workers=None):
+        '''
+        Draw the blockchains of all the peers, mode is one of render.RENDER_MODES
+        '''
+        render.renderChains([self.chainJob(i) for i in range(self.n)], mode, workers)
 
-        write_dot(tempGraph, f'./observations/BlockChains/bc_{i}.dot')
-        
+    def drawChain(self, unique_id, mode="png"):
+        '''
+        Draw the blockChain of single Peer 
+        '''
+        render.renderChains([self.chainJob(unique_id)], mode, workers=1)
 
-        
+    def peerType(self, peer):
+        cpu = 'honest' if peer.peer_type == 'honest' else 'selfish'
+        speed = 'slow' if peer.slow else 'fast'
+        return cpu + '_' + speed
 
-        
-        nx.draw(self.Peers[i].blockchain.bcTree, pos, with_labels=True, labels=labels)
-        nx.draw(self.Peers[i].blockchain.bcTree, with_labels=True, labels=labels)
-        if save:
-            plt.savefig(f'./observations/BlockChains/bc_{i}.png')
-        else:
-            plt.show()
+    def longestChain(self, peer):
+        '''
+        Block ids of the longest chain of the peer, from its tip back to the genesis block
+        '''
+        genesis = 0
+        block = peer.blockchain.long_Block
+        ordering = []
+        while block.id != genesis:
+            ordering.append(block.id)
+            block = block.pblk
+        ordering.append(0)
+        return ordering
+
+    def propagationMetrics(self, coverage = 0.9):
+        '''
+        Block propagation and fork metrics, used to compare the relay modes.
+        propagation_delay : Mean time for a block to reach coverage of the peers, over the blocks that did
+        forks : Number of blocks with more than one child
+        '''
+        blocks = self.ctx.blocks
+        num_blocks = len(blocks)
+        times, created, creators = self.arrivalData()
+        delays = arrivals.reachDelays(times, created, (coverage,))[0][1:]
+        delays = delays[~np.isnan(delays)]
+
+        forks = 0
+        for blkid in range(num_blocks):
+            child = blocks.first_child[blkid]
+            if child != -1 and blocks.next_sibling[child] != -1:
+                forks += 1
+        return {
+            "propagation_delay": float(delays.mean()) if len(delays) else None,
+            "forks": forks,
+        }
 
-        plt.figure()
-        nx.draw(self.Peers[i].blockchain.bcTree, pos=nx.kamada_kawai_layout(self.Peers[i].blockchain.bcTree), node_size=200, node_color='blue', with_labels=True)
-        # if save:
-            # plt.savefig(f'./observations/BlockChains/bc_kkl_{i}.png')
+    def arrivalData(self):
+        '''
+        Arrival matrix (peers x blocks) with the creation time and the creator of every block.
+        '''
+        blocks = self.ctx.blocks
+        times = self.ctx.arrivals.matrix(len(blocks))
+        created = np.array([block.vtime for block in blocks.blocks])
+        creators = np.array(blocks.creator[:len(blocks)], dtype=np.int64)
+        return times, created, creators
 
-    def printDetails(self):
+    def arrivalClasses(self):
         '''
-        Saving the details of the peers in the network 
+        Masks of the peers of every class the propagation delays are split by.
         '''
+        slow = np.array([peer.slow for peer in self.Peers], dtype=bool)
+        honest = np.array([peer.peer_type == "honest" for peer in self.Peers], dtype=bool)
+        return {"slow": slow, "fast": ~slow, "honest": honest, "selfish": ~honest}
 
+    def saveArrivals(self, path):
+        '''
+        Save the arrival matrix, block creation times and creators and the peer classes in one .npz,
+        python -m utils.arrivals path prints the propagation percentiles from it.
+        '''
+        arrivals.saveArrivals(path, *self.arrivalData(), self.arrivalClasses())
 
+    def computeMetrics(self, honest_Peer = 3):
+        '''
+        Compute the metrics reported by printDetails, also used by the parameter sweep.
+        The MPU values are measured on the longest chain of the honest peer honest_Peer.
+        longest_chain : Length of the longest chain of honest_Peer (including genesis block)
+        canonical_length, canonical_creators : Length of the longest chain over all the peers and the number of blocks of each creator on it
+        total_blocks : Total number of blocks created in the network
+        ratios : Ratio of blocks mined by each peer that made it to its longest chain
+        average_type_ratios : Average of the ratios per type of peer
+        adv_blk_created, adv_blk_in_chain : Blocks created by each selfish miner and how many are in the longest chain
+        mpu : MPU of each selfish miner
+        mpu_overall : Length of the longest chain over total blocks
+        suppressed_txns : Duplicate transactions received by the peers and not relayed again
+        propagation_delay, forks : see propagationMetrics
+        stale_rate : Fraction of the mined blocks that are not in the longest chain, None when no block was mined
+        reorgs, max_reorg : Longest chain switches of the peers that dropped blocks, and the most blocks one of them dropped
+        All the chain counts come from ctx.chain_metrics, so this is O(peers) and can be called during a run.
+        traffic : Modelled data sent per kind of message in the relay mode of the run
+        '''
+        chain_metrics = self.ctx.chain_metrics
+        types = ['honest_slow', 'honest_fast', 'selfish_slow', 'selfish_fast']
+        type_sums = dict.fromkeys(types, 0)
+        type_counts = dict.fromkeys(types, 0)
         ratios = {}
-        print_graph(self.Graph)
-
-        for i in range(self.n):
-            unique_id = i
+        for unique_id in range(self.n):
             peer = self.Peers[unique_id]
-            self.drawChain(unique_id, save=True)
-            genesis = 0
-
-            node_type_successful = {}
-            node_type_blocks_mined = {}
-            for type in ['slow_low', 'slow_high', 'fast_low', 'fast_high']:
-                node_type_successful[type] = 0
-                node_type_blocks_mined[type] = 0
-            mined_in_longest_chain = {}
-
-            block = peer.blockchain.long_Block
-            ordering = []
-            while block.id != genesis:
-                ordering.append(block.id)
-                temp_peer = block.creator
-                block = temp_peer.blockchain.id2blk[block.pblkid]
-            ordering.append(0)
-
-            self.drawChain(unique_id, save=True)
-            count = 0
-            for i in ordering: 
-                if i in peer.blocksCreated:
-                    count += 1
             if len(peer.blocksCreated) == 0:
                 ratios[unique_id] = None
-            else:
-                ratios[unique_id] = count/len(peer.blocksCreated)
-                # round off the ratio to 3 decimal places
-                ratios[unique_id] = round(ratios[unique_id], 3)
-
-            cpu = 'honest' if peer.peer_type == 'honest' else 'selfish'
-            speed = 'slow' if peer.slow else 'fast'
-            type_peer = cpu + '_' + speed
-
+                continue
+            # round off the ratio to 3 decimal places
+            ratios[unique_id] = round(chain_metrics.own[unique_id]/len(peer.blocksCreated), 3)
+            type = self.peerType(peer)
+            type_sums[type] += ratios[unique_id]
+            type_counts[type] += 1
 
-            with open(f'./observations/Results/peer_{unique_id}.txt', 'a') as f:
-                f.write("Peer_" + str(unique_id) + " is of type " + type_peer + " \n")
-                f.write("Peer Block Details:" + str(peer.blocksCreated) + str(peer.blockchain.id2blk.keys()) + str(peer.blockchain.id2blk_orphan.keys()) + str(peer.blockchain.arrival_time.keys()) + "\n")
-                f.write("Length of longest chain (including genesis block):" + str(peer.blockchain.long_Block.length) + "\n")
-                f.write("Longest chain:" + str(ordering) + "\n")
-                f.write("Total number of blocks at Peer_" +str(unique_id) +" : "  + str(total_blocks() - 1) + "\n")
-                f.write("Fraction of longChain to Total Blocks " + str(len(ordering)/(total_blocks())) + "\n")
-                f.write("Ratio of blocks mined by Peer_" +str(unique_id) + " that made it to the longest chain: " + str(ratios[unique_id]) + "\n")
-                f.write("\n")
-            
-            # Store Arrival times of Blocks 
-            with open(f'./observations/Results/arrival_times_peer_{unique_id}.csv', 'a') as f:
-                f.write("Block_id, Arrival_Time \n")
-                for key in peer.blockchain.arrival_time:
-                    f.write(str(key) + ", " + str(peer.blockchain.arrival_time[key]) + "\n")
-        '''
-                
-        # print("Ratios of blocks mined by each node that made it to the longest chain:", ratios)
-        types = ['low_slow', 'high_slow', 'low_fast', 'high_fast']
         average_type_ratios = {}
-        # iterate through the ratios and check for the type of the peer
         for type in types:
-            sum = 0
-            count = 0
-            for key in ratios:
-                peer = self.Peers[key]
-                # cpu = 'low' if peer.low_CPU else 'high'
-                cpu = 'honest' if peer.peer_type == 'honest' else 'selfish'
-                speed = 'slow' if peer.slow else 'fast'
-
-                type_peer = cpu + '_' + speed
-                if type == type_peer:
-                    if ratios[key] == None:
-                        continue
-                    sum += ratios[key]
-                    count += 1
-            if count == 0:
+            if type_counts[type] == 0:
                 average_type_ratios[type] = None
-            else  :
-                average_type_ratios[type] = sum/count
-                average_type_ratios[type] = round(average_type_ratios[type], 3)
-        
-        '''
-
-        # append values to csv file 
-        # with open(f'./observations/Results/average_type_ratios.csv', 'a') as f:
-        #     # f.write("Type, Average_Ratio \n")
-        #     for key in average_type_ratios:
-        #         f.write(key + ", " + str(average_type_ratios[key]) + "\n")
+            else:
+                average_type_ratios[type] = round(type_sums[type]/type_counts[type], 3)
+
+        adv_blk_created = [len(self.Peers[0].blocksCreated), len(self.Peers[1].blocksCreated)]
+        adv_blk_in_chain = list(chain_metrics.watched_in_chain[honest_Peer])
+        longest_chain_length = self.Peers[honest_Peer].blockchain.long_Block.length
+
+        # MPU is 0 if the selfish miner did not create any block
+        mpu = [0 if created == 0 else in_chain/created for created, in_chain in zip(adv_blk_created, adv_blk_in_chain)]
+
+        suppressed_txns = 0
+        for peer in self.Peers:
+            suppressed_txns += peer.suppressed_txns
+
+        # no stale rate before the first block is mined
+        mined = self.ctx.total_blocks() - 1
+        stale_rate = None if mined == 0 else 1 - (longest_chain_length - 1)/mined
+
+        return {
+            "longest_chain": longest_chain_length,
+            "canonical_length": chain_metrics.longestChain(),
+            "canonical_creators": list(chain_metrics.canonical_creators),
+            "total_blocks": self.ctx.total_blocks(),
+            "ratios": ratios,
+            "average_type_ratios": average_type_ratios,
+            "adv_blk_created": adv_blk_created,
+            "adv_blk_in_chain": adv_blk_in_chain,
+            "mpu": mpu,
+            "mpu_overall": longest_chain_length/self.ctx.total_blocks(),
+            "suppressed_txns": suppressed_txns,
+            "traffic": dict(self.ctx.traffic),
+            "stale_rate": stale_rate,
+            "reorgs": chain_metrics.reorgs,
+            "max_reorg": chain_metrics.max_reorg,
+            **self.propagationMetrics(),
+        }
 
+    def printDetails(self, render_mode="none", workers=None):
         '''
-        # print ratios in formatted way
-        for key in ratios:
-            peer = self.Peers[key]
-            cpu = 'low' if peer.low_CPU else 'high'
-            speed = 'slow' if peer.slow else 'fast'
-            type_peer = cpu + '_' + speed
-            print(f"Ratio of blocks mined by Peer_{key} of type "+ type_peer + f" that made it to the longest chain: {ratios[key]}")
-
-        # print("Average Type Ratios: ", average_type_ratios)
-        for type in types:
-            print(f"Average ratio of blocks in longest chain mined by {type} node:", average_type_ratios[type])
+        Saving the details of the peers in the network 
+        render_mode draws the blockchains of the peers, see utils.render, with workers processes
         '''
-        # Here for each blk in blockchain check if it is made by honest or selfish miner and store the count 
-        # check block chain n-1 peer 
-        # check for the block chain of selfish miner
-        # selfish_count1 = 0
-        # selfish_count2 = 0
-        # total_self_blks = 0
-        # blockChain = self.Peers[self.n-1].blockchain
-        # for blk in blockChain.bcTree.nodes():
-        #     if blk == 0:
-        #         continue
-        #     creator = blockChain.id2blk[blk].creator
-        #     if creator.peer_type == "selfish1" or creator.peer_type == "selfish2":
-        #         selfish_count += 1
-        #     total_self_blks += 1
-        # print("Selfish count in the block chain of n-1 peer: ", selfish_count, " Total Selfish blocks: ", total_self_blks)
-
-        longest_chain_length = 0
-        # get total number of blocks 
-        # for i in range(self.n):
-        #     longest_chain_length = max(longest_chain_length, self.Peers[i].blockchain.long_Block.length)
-
-        adv1_blk_created = self.Peers[0].blocksCreated
-        adv2_blk_created = self.Peers[1].blocksCreated
 
-        adv1_blk_in_chain = 0
-        adv2_blk_in_chain = 0
+        metrics = self.computeMetrics()
+        ratios = metrics["ratios"]
+        if render_mode == "png":
+            print_graph(self.Graph)
+        self.drawBlockChains(render_mode, workers)
 
-        honest_Peer = 3
-
-
-        honest_long_blk = self.Peers[honest_Peer].blockchain.long_Block
-        longest_chain_length = honest_long_blk.length
-
-        while honest_long_blk.id != 0:
-            if honest_long_blk.creator.peer_type == "selfish1":
-                adv1_blk_in_chain += 1
-            if honest_long_blk.creator.peer_type == "selfish2":
-                adv2_blk_in_chain += 1
-            honest_long_blk = self.Peers[honest_Peer].blockchain.id2blk[honest_long_blk.pblkid]
-
-
-
-        # print MPU only if adv1_blk_created is non zero else print 0 
-        if len(adv1_blk_created) == 0:
-            print("MPU of selfish miner 0: 0")
-        else:
-            print("MPU of selfish miner 0: ", adv1_blk_in_chain/len(adv1_blk_created))
+        for i in range(self.n):
+            unique_id = i
+            peer = self.Peers[unique_id]
+            ordering = self.longestChain(peer)
+            type_peer = self.peerType(peer)
 
-        if len(adv2_blk_created) == 0:
-            print("MPU of selfish miner 1: 0")
-        else:
-            print("MPU of selfish miner 1: ", adv2_blk_in_chain/len(adv2_blk_created))
 
-        print("MPU overall: ", longest_chain_length/total_blocks())
-        print("Blocks created by selfish miner 0: ", len(adv1_blk_created), " Blocks in longest chain: ", adv1_blk_in_chain)
-        print("Blocks created by selfish miner 1: ", len(adv2_blk_created), " Blocks in longest chain: ", adv2_blk_in_chain)
+            with open(f'./observations/Results/peer_{unique_id}.txt', 'a') as f:
+                f.write("Peer_" + str(unique_id) + " is of type " + type_peer + " \n")
+                f.write("Peer Block Details:" + str(peer.blocksCreated) + str(peer.blockchain.knownIds()) + str(peer.blockchain.orphanIds()) + str([blkid for blkid, time_s in peer.blockchain.arrivedBlocks()]) + "\n")
+                f.write("Length of longest chain (including genesis block):" + str(peer.blockchain.long_Block.length) + "\n")
+                f.write("Longest chain:" + str(ordering) + "\n")
+                f.write("Total number of blocks at Peer_" +str(unique_id) +" : "  + str(self.ctx.total_blocks() - 1) + "\n")
+                f.write("Fraction of longChain to Total Blocks " + str(len(ordering)/(self.ctx.total_blocks())) + "\n")
+                f.write("Ratio of blocks mined by Peer_" +str(unique_id) + " that made it to the longest chain: " + str(ratios[unique_id]) + "\n")
+                f.write("\n")
+            
 
-        print("Length of longest Chain : ", longest_chain_length, " Total Blocks : ", total_blocks())
+        adv_blk_created = metrics["adv_blk_created"]
+        adv_blk_in_chain = metrics["adv_blk_in_chain"]
+        mpu = metrics["mpu"]
+
+        print("MPU of selfish miner 0: ", mpu[0])
+        print("MPU of selfish miner 1: ", mpu[1])
+
+        print("MPU overall: ", metrics["mpu_overall"])
+        print("Duplicate transactions not relayed again:", metrics["suppressed_txns"])
+        traffic = metrics["traffic"]
+        print("Mean time for a block to reach 90% of the peers:", metrics["propagation_delay"])
+        print("Fraction of blocks not in the longest chain:", metrics["stale_rate"], ", forks:", metrics["forks"])
+        print("Chain reorganisations:", metrics["reorgs"], ", most blocks dropped at once:", metrics["max_reorg"])
+        # Store Arrival times of Blocks 
+        self.saveArrivals('./observations/Results/arrival_times.npz')
+        print("\n".join(arrivals.report(*self.arrivalData(), self.arrivalClasses())))
+        print(f"Data sent in {self.ctx.relay_mode} relay mode:", ", ".join(f"{kind} = {round(size, 3)}" for kind, size in traffic.items()), f", total = {round(sum(traffic.values()), 3)}")
+        print("Blocks created by selfish miner 0: ", adv_blk_created[0], " Blocks in longest chain: ", adv_blk_in_chain[0])
+        print("Blocks created by selfish miner 1: ", adv_blk_created[1], " Blocks in longest chain: ", adv_blk_in_chain[1])
+
+        print("Length of longest Chain : ", metrics["longest_chain"], " Total Blocks : ", metrics["total_blocks"])
+        canonical_creators = metrics["canonical_creators"]
+        print("Longest chain over all the peers : ", metrics["canonical_length"], " Blocks of selfish miner 0 : ", canonical_creators[0], " Blocks of selfish miner 1 : ", canonical_creators[1], " Honest blocks : ", sum(canonical_creators[2:]))
         
 
                 
-    def checkFolder(self):
+    def checkFolder(self, resume=False):
         '''
         Function to check the folder and create if not present
+        A resumed run keeps the Events and Transactions it already wrote, resume=True, the Results and
+        BlockChains are always written again from the whole run.
         '''
 
         # check for observations folder 
@@ -435,6 +540,8 @@ class Simulator:
             os.remove(f'./observations/Results/{file}')
         for file in os.listdir('./observations/BlockChains'):
             os.remove(f'./observations/BlockChains/{file}')
+        if resume:
+            return
         for file in os.listdir('./observations/Events'):
             os.remove(f'./observations/Events/{file}')
         for file in os.listdir('./observations/Transactions'):
@@ -452,10 +559,21 @@ if __name__ == "__main__":
     parser.add_argument('-ttx', '--mean_inter_arrival', default=10, type=float, help='mean inter-arrival time between transactions')
     parser.add_argument('-I', '--average_block_mining_time', default=100, type=float, help='average time taken to mine a block')
     parser.add_argument('-s', '--save_events', default=False, type=bool, help='save the Events')
+    parser.add_argument('--trace', default=None, help='write a binary trace of the Events to this file')
+    parser.add_argument('--relay', default='full', choices=RELAY_MODES, help='relay mode of blocks and transactions')
+    parser.add_argument('--confirmation_depth', default=6, type=int, help='depth at which the peers forget the transactions of a block')
+    termination.addArguments(parser)
 
     parser.add_argument('-h0', '--hash_selfish0', default=0.3, type=float, help='hash power of selfish miner 0')
     parser.add_argument('-h1', '--hash_selfish1', default=0.3, type=float, help='hash power of selfish miner 1')
     parser.add_argument('-stop', '--stop_condition', default=False, type=float, help='stop condition after Blocks')
+    parser.add_argument('--profile', action='store_true', help='time the event handlers and count the EventList operations, summary in ./observations/Results/profile.txt')
+    parser.add_argument('--cprofile', action='store_true', help='also run cProfile, stats in ./observations/Results/profile.prof')
+    parser.add_argument('--render', default='none', choices=render.RENDER_MODES, help='draw the blockchains of the peers: none, dot files only, or dot and png')
+    parser.add_argument('--render_workers', default=None, type=int, help='processes drawing the png files, all the cpus by default')
+    parser.add_argument('--checkpoint', default=None, help='save the run to this file every --checkpoint_every events and at the end')
+    parser.add_argument('--checkpoint_every', default=1000000, type=int, help='events between two checkpoints')
+    parser.add_argument('--resume', default=None, help='continue the run saved in this checkpoint, the network parameters are ignored')
 
 
     # parser.add_argument('-zeta1', '--zeta_selfish1', default=0.3, type=float, help='Percentage of neighbors to selfish')
@@ -495,17 +613,31 @@ if __name__ == "__main__":
         h1 = 0.0001
 
 
-    print (f"Simulating the cryptocurrency network with {n} peers")
-    print(f"z0 = {z0}, ttx = {ttx}, I = {I}, h0 = {h0}, h1 = {h1}, stop = {stop}")
-
-
     hash_selfish = [h0, h1]
     # zeta = [zeta1, zeta2]
 
 
-    sim = Simulator(n, z0, ttx, I, hash_selfish, save_Events=save, stop_condition=stop)
-    sim.checkFolder()
-    sim.simulate()
-    # sim.drawBlockChains(save=True)
-    sim.printDetails()
+    if args.resume is not None:
+        sim = Simulator.resume(args.resume)
+        # the network parameters of a resumed run are the saved ones, not the command line defaults
+        print(f"Resumed the simulation of the cryptocurrency network with {sim.n} peers from {args.resume}, stop = {sim.stop_condition}")
+        # stop conditions given on the command line replace the saved ones
+        predicates = termination.fromArguments(args)
+        if predicates:
+            sim.termination = termination.AnyOf(predicates)
+    else:
+        print (f"Simulating the cryptocurrency network with {n} peers")
+        print(f"z0 = {z0}, ttx = {ttx}, I = {I}, h0 = {h0}, h1 = {h1}, stop = {stop}")
+        sim = Simulator(n, z0, ttx, I, hash_selfish, save_Events=save, stop_condition=stop, trace=args.trace, relay=args.relay, stop_when=termination.fromArguments(args), confirmation_depth=args.confirmation_depth)
+    sim.checkFolder(resume=args.resume is not None)
+    profiler = profiling.Profiler(cprofile=args.cprofile) if args.profile or args.cprofile else None
+    with profiler.profile(sim) if profiler is not None else nullcontext():
+        sim.simulate(checkpoint=args.checkpoint, checkpoint_every=args.checkpoint_every)
+        if args.checkpoint is not None:
+            sim.checkpoint(args.checkpoint)
+        sim.drain()
+    sim.printDetails(render_mode=args.render, workers=args.render_workers)
+    if profiler is not None:
+        profiler.save('./observations/Results/profile')
+        print("\n".join(profiler.summary(top=0)))
     # sim.printRes()
\ No newline at end of file
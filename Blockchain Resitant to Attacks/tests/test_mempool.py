@@ -0,0 +1,60 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.context import SimulationContext
+from utils.definitions import Block, Transaction
+from utils.utils import get_Peers
+
+
+class BuryTest(unittest.TestCase):
+    def setUp(self):
+        self.ctx = SimulationContext()
+        self.ctx.confirmation_depth = 2
+        self.Peers = get_Peers(self.ctx, 4, 50, 50)
+        self.peer = self.Peers[0]
+
+    def chain(self, parent, length):
+        '''
+        length blocks on top of parent, each with one payment from Peer_1 held in the mempool of the peer.
+        '''
+        blocks = []
+        for i in range(length):
+            txn = Transaction(self.ctx, peer1=self.Peers[1], peer2=self.Peers[2], amount=1, timestamp=0)
+            self.peer.pending_txns.add(txn)
+            block = Block(self.ctx, 0, parent.id, self.Peers[3], Transaction(self.ctx, peer1=self.Peers[3], amount=50, timestamp=0, is_coinbase=True))
+            block.setTxns([txn])
+            blocks.append(block)
+            parent = block
+        return blocks
+
+    def extend(self, tip):
+        self.peer.blockchain.setLongBlock(tip)
+        self.peer.buryConfirmed()
+
+    def pending(self, blocks):
+        return [block.txns[1] in self.peer.pending_txns for block in blocks]
+
+    def test_buries_new_branch_after_deep_reorg(self):
+        '''
+        After a reorg deeper than the confirmation depth the blocks of the new branch below it are buried too.
+        '''
+        genesis = self.peer.blockchain.long_Block
+        first = self.chain(genesis, 8)
+        self.extend(first[-1])
+        self.assertEqual(self.pending(first), [False] * 6 + [True] * 2)
+        second = self.chain(first[1], 9)
+        self.extend(second[-1])
+        self.assertEqual(self.pending(second), [False] * 7 + [True] * 2)
+
+    def test_depth_from_context(self):
+        self.ctx.confirmation_depth = 5
+        blocks = self.chain(self.peer.blockchain.long_Block, 8)
+        self.extend(blocks[-1])
+        self.assertEqual(self.pending(blocks), [False] * 3 + [True] * 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
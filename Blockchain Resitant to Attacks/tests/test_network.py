@@ -0,0 +1,41 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.context import SimulationContext
+from utils.utils import generate_network, MIN_DEGREE, MAX_DEGREE
+
+
+def reached(indptr, indices):
+    seen = {0}
+    stack = [0]
+    while stack:
+        x = stack.pop()
+        for y in indices[indptr[x]:indptr[x + 1]].tolist():
+            if y not in seen:
+                seen.add(y)
+                stack.append(y)
+    return len(seen)
+
+
+class NetworkTest(unittest.TestCase):
+    def test_degree_bounds_small_networks(self):
+        '''
+        Every peer has between MIN_DEGREE and MAX_DEGREE neighbours and the network is connected,
+        also for the small networks where the random picks most often leave a peer short.
+        '''
+        for n in (4, 5, 6, 8, 12):
+            for seed in range(300):
+                Peers, (indptr, indices) = generate_network(SimulationContext(seed), n, 50, 50)
+                degrees = (indptr[1:] - indptr[:-1]).tolist()
+                with self.subTest(n=n, seed=seed):
+                    self.assertGreaterEqual(min(degrees), MIN_DEGREE)
+                    self.assertLessEqual(max(degrees), MAX_DEGREE)
+                    self.assertEqual(reached(indptr, indices), n)
+                    self.assertEqual([len(peer.neighbors) for peer in Peers], degrees)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+class ResumeTest(unittest.TestCase):
+    def run_main(self, folder, *args):
+        result = subprocess.run([sys.executable, MAIN, *args], cwd=folder, capture_output=True, text=True, check=True)
+        return result.stdout
+
+    def test_one_report_per_peer(self):
+        '''
+        A run checkpointed and then resumed writes a single report for every peer,
+        and announces the size of the network it resumed, not the command line defaults.
+        '''
+        with tempfile.TemporaryDirectory() as folder:
+            self.run_main(folder, '-n', '12', '--max_events', '2000', '--checkpoint', 'run.ckpt')
+            stdout = self.run_main(folder, '--resume', 'run.ckpt', '--max_events', '2000')
+            self.assertIn('with 12 peers', stdout)
+            results = os.path.join(folder, 'observations', 'Results')
+            for unique_id in range(12):
+                with open(os.path.join(results, f'peer_{unique_id}.txt')) as f:
+                    self.assertEqual(f.read().count(' is of type '), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import csv
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sweep
+from utils import termination
+
+
+GRID = {'n': [10], 'z0': [50], 'ttx': [10], 'I': [100], 'h0': [0.3], 'h1': [0.3], 'relay': ['full'], 'depth': [6]}
+
+
+class SweepTest(unittest.TestCase):
+    def readRows(self, path):
+        with open(path, newline='') as f:
+            return list(csv.DictReader(f))
+
+    def test_stopped_before_first_block(self):
+        '''
+        A run stopped by a termination predicate before any block is mined still gives a CSV row.
+        '''
+        with tempfile.TemporaryDirectory() as folder:
+            output = os.path.join(folder, 'sweep.csv')
+            sweep.sweep(GRID, 2, output, workers=1, stop_when=[termination.EventBudget(10)])
+            rows = self.readRows(output)
+        self.assertEqual(len(rows), 2)
+        for row in rows:
+            self.assertEqual(row['stopped_by'], 'max_events')
+            self.assertEqual(row['total_blocks'], '1')
+            self.assertEqual(row['stale_rate'], '')
+            self.assertEqual(row['error'], '')
+
+    def test_failed_run_is_recorded(self):
+        '''
+        A run that raises gives a row with its error, the other runs of the sweep still complete.
+        '''
+        grid = dict(GRID, relay=['full', 'bogus'])
+        with tempfile.TemporaryDirectory() as folder:
+            output = os.path.join(folder, 'sweep.csv')
+            sweep.sweep(grid, 1, output, workers=1, stop_when=[termination.EventBudget(10)])
+            rows = {row['relay']: row for row in self.readRows(output)}
+        self.assertEqual(rows['full']['stopped_by'], 'max_events')
+        self.assertEqual(rows['bogus']['stopped_by'], 'error')
+        self.assertIn('ValueError', rows['bogus']['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import gzip
+import os
+import pickle
+from utils.definitions import Peer, Block
+
+
+'''
+Checkpoints of a running simulation.
+The whole Simulator is pickled, except that Peers and Blocks are written as a reference (kind, id) wherever
+they appear and their own state is written once, one record per object in id order. Neighbour lists and
+chains of parent blocks would otherwise make pickle recurse as deep as the longest path through them.
+Records are streamed to a gzip file one at a time through a single Pickler, so no second copy of the state
+is built in memory, and the random generators are pickled with their state, so a resumed run continues
+exactly like the run it was saved from.
+'''
+
+FORMAT = 2
+
+
+class CheckpointPickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        kind = type(obj)
+        if kind is Peer:
+            return ("peer", obj.unique_id)
+        if kind is Block:
+            return ("block", obj.id)
+        return None
+
+
+class CheckpointUnpickler(pickle.Unpickler):
+    def __init__(self, file):
+        super().__init__(file)
+        self.objects = {"peer": [], "block": []}
+
+    def persistent_load(self, pid):
+        kind, key = pid
+        return self.objects[kind][key]
+
+
+def saveCheckpoint(sim, path, compresslevel = 1):
+    '''
+    Write the state of sim to path. The file is written next to path and renamed when complete,
+    so a run killed while saving keeps its previous checkpoint.
+    '''
+    blocks = sim.ctx.blocks.blocks
+    partial = path + '.partial'
+    with gzip.open(partial, 'wb', compresslevel=compresslevel) as f:
+        pickler = CheckpointPickler(f, pickle.HIGHEST_PROTOCOL)
+        pickler.dump((FORMAT, len(sim.Peers), [block is not None for block in blocks]))
+        for block in blocks:
+            if block is not None:
+                pickler.dump(block.__dict__)
+        for peer in sim.Peers:
+            pickler.dump(peer.__dict__)
+        pickler.dump(sim)
+    os.replace(partial, path)
+
+
+def loadCheckpoint(path):
+    '''
+    Read back a Simulator written by saveCheckpoint.
+    '''
+    with gzip.open(path, 'rb') as f:
+        unpickler = CheckpointUnpickler(f)
+        version, num_peers, present = unpickler.load()
+        if version != FORMAT:
+            raise ValueError(f"{path} is a checkpoint of format {version}, expected {FORMAT}")
+        blocks = [Block.__new__(Block) if known else None for known in present]
+        peers = [Peer.__new__(Peer) for _ in range(num_peers)]
+        unpickler.objects = {"peer": peers, "block": blocks}
+        for block in blocks:
+            if block is not None:
+                block.__setstate__(unpickler.load())
+        for peer in peers:
+            peer.__dict__.update(unpickler.load())
+        return unpickler.load()
@@ -1,40 +1,100 @@
-from numpy import random 
+import numpy as np
 
-# create a seed random 
-seed = 0
-random.seed(seed)
+
+class BufferedSampler:
+    '''
+    Hands out the values of a distribution one by one from chunks drawn in a single call,
+    refilling transparently. draw(*args, size) returns an array of size values, draw is a method of
+    a Generator rather than a lambda so that the sampler can be pickled with the run.
+    '''
+    def __init__(self, draw, *args, chunk = 1 << 16):
+        self.draw = draw
+        self.args = args
+        self.chunk = chunk
+        self.values = []
+        self.pos = 0
+
+    def __call__(self):
+        if self.pos == len(self.values):
+            self.values = self.draw(*self.args, self.chunk).tolist()
+            self.pos = 0
+        value = self.values[self.pos]
+        self.pos += 1
+        return value
 
 
-def ExponentialDist(rate):
-    # introduce a seeded random dist 
-    return lambda: random.exponential(rate)
+def ExponentialDist(rate, rng):
+    # seeded random dist, give every distribution its own rng from SimulationContext.spawnRng
+    return BufferedSampler(rng.exponential, rate)
 
 
-def getHashDist( Peers, I,hash_selfish, min=1, max=10 ):
+def getHashDist( Peers, I, hash_selfish, ctx, min=1, max=10 ):
     '''
     Helpler function to get the hash distribution for the peers
     '''
 
     n = len(Peers)
     val = min*(1 - hash_selfish[0] - hash_selfish[1]) / (n -2 )
-    honestHash = ExponentialDist(I/val)
+    honestHash = ExponentialDist(I/val, ctx.spawnRng())
     return honestHash
 
-def UniformDist(low, high):
+
+class LatencyModel:
     '''
-    labmda function to generate values from uniform distribution.
+    Latency engine built once from the network.
+    For every peer it keeps its neighbours in id order with the propagation delay rho and
+    link speed c of each link, rho is drawn once per link instead of once per message.
+    Queueing delays are taken from a prefilled batch of standard exponentials refilled in blocks,
+    so a whole broadcast costs a handful of array operations.
     '''
-    return lambda: random.uniform(low, high)
+    def __init__(self, Peers, rng, batch = 1 << 16):
+        self.rng = rng
+        self.batch = batch
+        self.rho = []
+        self.tx_cost = [] # msec per unit of message, 8/cij
+        self.queue_mean = [] # mean queueing delay, 96/cij
+        self.slot = [] # position of every neighbour in the arrays of the peer
+        link_rho = {}
+        for peer in Peers:
+            rho = []
+            cij = []
+            for nbr in peer.neighbors:
+                link = (min(peer.unique_id, nbr.unique_id), max(peer.unique_id, nbr.unique_id))
+                if link not in link_rho:
+                    link_rho[link] = rng.uniform(10.0, 500.0) #msec
+                rho.append(link_rho[link])
+                cij.append(5.0 if peer.slow or nbr.slow else 100.0) # mb
+            cij = np.array(cij)
+            self.slot.append({nbr.unique_id: k for k, nbr in enumerate(peer.neighbors)})
+            self.rho.append(np.array(rho))
+            self.tx_cost.append(8.0 / cij)
+            self.queue_mean.append(96.0 / cij)
+        self.exp = rng.standard_exponential(batch)
+        self.pos = 0
 
+    def draw(self, k):
+        '''
+        Next k standard exponentials of the batch, refilling it when it runs out.
+        '''
+        if self.pos + k > len(self.exp):
+            self.exp = np.concatenate((self.exp[self.pos:], self.rng.standard_exponential(max(self.batch, k))))
+            self.pos = 0
+        vals = self.exp[self.pos:self.pos + k]
+        self.pos += k
+        return vals
 
-def getLatency(peerX, peerY, message):
-    '''
-    Hellper function to get the latency between the peers.
-    '''
-    if( not peerX.slow and not peerY.slow):
-        cij = 100 # mb
-    else:
-        cij = 5
-    dij = random.exponential(96.0/ (cij)) #msec
-    rhoij = random.uniform(10.0, 500.0) #msec
-    return rhoij + (message*8)/(cij) + dij
\ No newline at end of file
+    def broadcast(self, peer, message):
+        '''
+        Latencies of a message sent by peer to every neighbour, in the order of peer.neighbors.
+        '''
+        i = peer.unique_id
+        rho = self.rho[i]
+        return rho + message * self.tx_cost[i] + self.queue_mean[i] * self.draw(len(rho))
+
+    def link(self, peer, nbr, message):
+        '''
+        Latency of a single message from peer to its neighbour nbr.
+        '''
+        i = peer.unique_id
+        k = self.slot[i][nbr.unique_id]
+        return float(self.rho[i][k] + message * self.tx_cost[i][k] + self.queue_mean[i][k] * self.draw(1)[0])
@@ -0,0 +1,59 @@
+import argparse
+import os
+import subprocess
+import sys
+
+'''
+Import time budget of the simulation core.
+The module is imported in a fresh interpreter under python -X importtime, best of repeat runs, and the check
+fails when the import takes longer than the budget or loads any of the plotting modules, which are only
+imported when the blockchains are drawn (utils.render, print_graph).
+
+Usage:
+python -m utils.importbudget --module main --budget 300
+'''
+
+PLOTTING = ("matplotlib", "networkx", "pygraphviz")
+
+
+def measure(module = "main", cwd = None):
+    '''
+    (total, times) of one import of module, total is its cumulative import time in microseconds
+    and times maps every module imported on the way to its cumulative time.
+    '''
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=cwd, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times[module], times
+
+
+def check(module = "main", budget = 300, repeat = 5, cwd = None):
+    '''
+    (ok, total_ms, plotting, times) of the fastest of repeat imports, plotting lists the plotting modules it loaded.
+    '''
+    total, times = min((measure(module, cwd) for _ in range(repeat)), key=lambda run: run[0])
+    total_ms = total / 1000
+    plotting = sorted(name for name in times if name.split(".")[0] in PLOTTING)
+    return total_ms <= budget and not plotting, total_ms, plotting, times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the import time of the simulation core')
+    parser.add_argument('--module', default='main', help='module to import')
+    parser.add_argument('--budget', default=300, type=float, help='import time budget in milliseconds')
+    parser.add_argument('--repeat', default=5, type=int, help='imports measured, the fastest one is kept')
+    parser.add_argument('--top', default=10, type=int, help='number of the slowest modules listed')
+    args = parser.parse_args()
+
+    ok, total_ms, plotting, times = check(args.module, args.budget, args.repeat, cwd=os.getcwd())
+    print(f"import {args.module}: {total_ms:.1f} ms, budget {args.budget:g} ms")
+    for name, cumulative in sorted(times.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    if plotting:
+        print("plotting modules imported:", ", ".join(plotting))
+    sys.exit(0 if ok else 1)
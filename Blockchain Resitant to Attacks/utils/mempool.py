@@ -0,0 +1,56 @@
+class Mempool:
+    '''
+    Pending transactions of a peer, indexed by sender in arrival order.
+    Contains the following attributes:
+    by_sender : unique_id of the sender -> its pending transactions by txid, in arrival order.
+                Senders without pending transactions are dropped, so iterating it only visits active senders.
+    size : Number of pending transactions.
+    '''
+
+    def __init__(self):
+        self.by_sender = {}
+        self.size = 0
+
+    def add(self, txn):
+        queue = self.by_sender.setdefault(txn.peer1.unique_id, {})
+        if txn.txid not in queue:
+            queue[txn.txid] = txn
+            self.size += 1
+
+    def discard(self, txn):
+        queue = self.by_sender.get(txn.peer1.unique_id)
+        if queue is None or queue.pop(txn.txid, None) is None:
+            return
+        self.size -= 1
+        if not queue:
+            del self.by_sender[txn.peer1.unique_id]
+
+    def __contains__(self, txn):
+        queue = self.by_sender.get(txn.peer1.unique_id)
+        return queue is not None and txn.txid in queue
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for queue in self.by_sender.values():
+            yield from queue.values()
+
+    def senders(self):
+        return list(self.by_sender)
+
+    def select(self, budgets, limit):
+        '''
+        Pick upto limit transactions for a block. budgets holds the spendable balance of every sender
+        in the order of senders(), each sender contributes the longest prefix of its queue it can pay for.
+        '''
+        included = []
+        for queue, budget in zip(self.by_sender.values(), budgets):
+            for txn in queue.values():
+                if len(included) == limit:
+                    return included
+                if txn.amount > budget:
+                    break
+                budget -= txn.amount
+                included.append(txn)
+        return included
@@ -0,0 +1,69 @@
+from heapq import heappush, heappop, heapify
+from itertools import count
+
+
+class EventQueue:
+    '''
+    Single threaded event scheduler built on heapq.
+    Entries are stored as (timestamp, seq, event) where seq is a monotonically increasing
+    counter, so events with equal timestamps pop in the order they were pushed and two
+    Event objects are never compared.
+    '''
+
+    def __init__(self):
+        self.heap = []
+        self.seq = count()
+
+    def push(self, timestamp, event):
+        '''
+        Schedule a single event at timestamp.
+        '''
+        heappush(self.heap, (timestamp, next(self.seq), event))
+
+    def push_many(self, entries):
+        '''
+        Schedule many (timestamp, event) pairs at once, used for the neighbour broadcasts.
+        Large batches are appended and heapified instead of pushed one by one.
+        '''
+        heap = self.heap
+        seq = self.seq
+        entries = [(timestamp, next(seq), event) for timestamp, event in entries]
+        if len(entries) > len(heap):
+            heap.extend(entries)
+            heapify(heap)
+        else:
+            for entry in entries:
+                heappush(heap, entry)
+
+    def pop(self):
+        '''
+        Remove and return the earliest (timestamp, event) pair.
+        '''
+        timestamp, _, event = heappop(self.heap)
+        return timestamp, event
+
+    def peek(self):
+        '''
+        Return the earliest (timestamp, event) pair without removing it.
+        '''
+        timestamp, _, event = self.heap[0]
+        return timestamp, event
+
+    def __getstate__(self):
+        # store the next sequence number instead of the itertools.count
+        seq = next(self.seq)
+        self.seq = count(seq)
+        return {"heap": self.heap, "seq": seq}
+
+    def __setstate__(self, state):
+        self.heap = state["heap"]
+        self.seq = count(state["seq"])
+
+    def empty(self):
+        return not self.heap
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __bool__(self):
+        return bool(self.heap)
@@ -0,0 +1,208 @@
+import math
+import time as clock
+from utils.definitions import BLK_GEN, BLK_REC
+
+
+'''
+Termination predicates of a simulation run.
+A predicate is called as predicate(time, event) with every event popped from the EventList, before the
+event is handled, and returns True when the run has to stop. start(sim) is called at the beginning of every
+call to simulate, so the wall clock and event budgets count from there when a stopped or checkpointed run is
+continued. Predicates are checked on every event, so each of them only does a constant amount of work.
+A predicate only sees the effect of an event when the next one is popped, so once the EventList runs out
+finish() tells whether the last handled event met it.
+'''
+
+
+class SimTime:
+    '''
+    Stop at the first event past the simulated time horizon.
+    '''
+    name = "sim_time"
+
+    def __init__(self, horizon):
+        self.horizon = horizon
+
+    def start(self, sim):
+        pass
+
+    def __call__(self, time, event):
+        return time > self.horizon
+
+    def finish(self):
+        return False
+
+
+class BlocksMined:
+    '''
+    Stop once limit blocks have been mined in the whole network, the genesis block is not counted.
+    '''
+    name = "max_blocks"
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.ctx = None
+
+    def start(self, sim):
+        self.ctx = sim.ctx
+
+    def __call__(self, time, event):
+        return self.ctx.total_blocks() - 1 >= self.limit
+
+    def finish(self):
+        return self.ctx.total_blocks() - 1 >= self.limit
+
+
+class WallClock:
+    '''
+    Stop once the run has taken seconds of wall clock time. The clock is only read every
+    every events, so the run can overshoot by that many events.
+    '''
+    name = "wall_time"
+
+    def __init__(self, seconds, every = 1024):
+        self.seconds = seconds
+        self.every = every
+        self.deadline = None
+        self.count = 0
+
+    def start(self, sim):
+        self.deadline = clock.perf_counter() + self.seconds
+        self.count = 0
+
+    def __call__(self, time, event):
+        self.count += 1
+        if self.count < self.every:
+            return False
+        self.count = 0
+        return clock.perf_counter() >= self.deadline
+
+    def finish(self):
+        return False
+
+
+class EventBudget:
+    '''
+    Stop after max_events events have been handled.
+    '''
+    name = "max_events"
+
+    def __init__(self, max_events):
+        self.max_events = max_events
+        self.count = 0
+
+    def start(self, sim):
+        self.count = 0
+
+    def __call__(self, time, event):
+        self.count += 1
+        return self.count > self.max_events
+
+    def finish(self):
+        return False
+
+
+class ChainQuorum:
+    '''
+    Stop once a fraction quorum of the peers have a longest chain of at least length blocks (including genesis).
+    Only the peer that handled the previous block event can have a longer chain, so only that one is looked at.
+    '''
+    name = "quorum"
+
+    def __init__(self, length, quorum = 0.5):
+        self.length = length
+        self.quorum = quorum
+        self.needed = None
+        self.reached = None
+        self.count = 0
+        self.last = None
+
+    def start(self, sim):
+        self.needed = max(math.ceil(self.quorum * sim.n), 1)
+        self.reached = bytearray(sim.n)
+        self.count = 0
+        self.last = None
+        # a continued run may already have peers past the length
+        for peer in sim.Peers:
+            if peer.blockchain.long_Block.length >= self.length:
+                self.reached[peer.unique_id] = 1
+                self.count += 1
+
+    def __call__(self, time, event):
+        peer = self.last
+        if event.event_type == BLK_GEN:
+            self.last = event.generator
+        elif event.event_type == BLK_REC:
+            self.last = event.receiver
+        else:
+            self.last = None
+        return self.check(peer)
+
+    def finish(self):
+        peer, self.last = self.last, None
+        return self.check(peer)
+
+    def check(self, peer):
+        if peer is None or self.reached[peer.unique_id] or peer.blockchain.long_Block.length < self.length:
+            return False
+        self.reached[peer.unique_id] = 1
+        self.count += 1
+        return self.count >= self.needed
+
+
+class AnyOf:
+    '''
+    Stops when any of its predicates does, fired is the predicate that stopped the run.
+    '''
+    def __init__(self, predicates):
+        self.predicates = list(predicates)
+        self.fired = None
+
+    def start(self, sim):
+        self.fired = None
+        for predicate in self.predicates:
+            predicate.start(sim)
+
+    def __call__(self, time, event):
+        for predicate in self.predicates:
+            if predicate(time, event):
+                self.fired = predicate
+                return True
+        return False
+
+    def finish(self):
+        for predicate in self.predicates:
+            if predicate.finish():
+                self.fired = predicate
+                return True
+        return False
+
+
+def addArguments(parser):
+    '''
+    Add the command line options of the termination predicates to an argparse parser.
+    '''
+    parser.add_argument('--sim_time', default=None, type=float, help='stop at this simulated time')
+    parser.add_argument('--max_blocks', default=None, type=int, help='stop once this many blocks are mined')
+    parser.add_argument('--wall_time', default=None, type=float, help='stop after this many seconds of wall clock time')
+    parser.add_argument('--max_events', default=None, type=int, help='stop after this many events')
+    parser.add_argument('--quorum', default=None, nargs=2, type=float, metavar=('LENGTH', 'FRACTION'),
+                        help='stop once FRACTION of the peers have a chain of LENGTH blocks')
+
+
+def fromArguments(args):
+    '''
+    Termination predicates selected by the options of addArguments.
+    '''
+    predicates = []
+    if args.sim_time is not None:
+        predicates.append(SimTime(args.sim_time))
+    if args.max_blocks is not None:
+        predicates.append(BlocksMined(args.max_blocks))
+    if args.wall_time is not None:
+        predicates.append(WallClock(args.wall_time))
+    if args.max_events is not None:
+        predicates.append(EventBudget(args.max_events))
+    if args.quorum is not None:
+        predicates.append(ChainQuorum(int(args.quorum[0]), args.quorum[1]))
+    return predicates
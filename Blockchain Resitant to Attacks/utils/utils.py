@@ -1,88 +1,249 @@
-from numpy.random import default_rng
-import networkx as nx
-import matplotlib.pyplot as plt
-from utils.definitions import Peer, Transaction, Event, BlockChain, Block
-from queue import PriorityQueue 
-from utils.generators import ExponentialDist
-
-random_gen = default_rng(0)
+import numpy as np
+from utils.definitions import Peer, Transaction, Block
+from utils.generators import LatencyModel
+
 Initbalance = 114 # Lets assume initial balance of all peers as 114.(75+20+19).
 
 
 
 
-def getPercent(zo, n):
+def getPercent(zo, n, rng):
     '''
     Function to get the percentage of slow and low CPU peers.
     '''
     arr = [True for i in range(int((zo * n) /100))] + [False for i in range(n - int((zo * n) /100))]
-    random_gen.shuffle(arr)
+    rng.shuffle(arr)
     return arr
 
 
-def get_Peers(num_of_peers, percent_slow, percent_low_CPU):
+def get_Peers(ctx, num_of_peers, percent_slow, percent_low_CPU):
     '''
     Function to initialize the Peers in the network.
     '''
     Peers = []
     honestNodes = num_of_peers - 2
-    slowNodes = getPercent(percent_slow, honestNodes)
-    lowCPUNodes = getPercent(percent_low_CPU, honestNodes)
+    slowNodes = getPercent(percent_slow, honestNodes, ctx.network_gen)
+    lowCPUNodes = getPercent(percent_low_CPU, honestNodes, ctx.network_gen)
     slowNodes = [False, False] +  slowNodes 
     lowCPUNodes = [False, False] +  lowCPUNodes 
     peer_type = ["selfish1", "selfish2"] + ["honest" for i in range (honestNodes)]
 
-    gensis = Block(0, 0, None, Transaction(peer1=None, amount=0, timestamp=0, is_coinbase=True), True,gen=True,  balances = [Initbalance]*num_of_peers)
+    gensis = Block(ctx, 0, 0, None, Transaction(ctx, peer1=None, amount=0, timestamp=0, is_coinbase=True), gen=True,  balances = [Initbalance]*num_of_peers)
     for i in range(num_of_peers):
-        Peers.append(Peer(i,slow=slowNodes[i],low_CPU=lowCPUNodes[i],balance=Initbalance, neighbors=[], gensis = gensis, peer_type=peer_type[i])) # Creating peers here.
+        Peers.append(Peer(ctx, i,slow=slowNodes[i],low_CPU=lowCPUNodes[i],balance=Initbalance, neighbors=[], gensis = gensis, peer_type=peer_type[i])) # Creating peers here.
     
     return Peers
 
 
 
-def generate_network(n, zo, z1): #p2p network connection
+MIN_DEGREE, MAX_DEGREE = 3, 6 # bounds on the number of neighbours of a peer
+
+
+class DisjointSet:
+    '''
+    Union-find over the peers, tracks the connected components while edges are added.
+    '''
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, x, y):
+        x, y = self.find(x), self.find(y)
+        if x == y:
+            return
+        if self.size[x] < self.size[y]:
+            x, y = y, x
+        self.parent[y] = x
+        self.size[x] += self.size[y]
+
+
+class NodePool:
+    '''
+    Set of nodes with O(1) add, remove and random pick.
+    '''
+    def __init__(self):
+        self.items = []
+        self.pos = {}
+
+    def add(self, x):
+        self.pos[x] = len(self.items)
+        self.items.append(x)
+
+    def remove(self, x):
+        i = self.pos.pop(x)
+        last = self.items.pop()
+        if last != x:
+            self.items[i] = last
+            self.pos[last] = i
+
+    def pick(self, rng):
+        return self.items[rng.integers(len(self.items))]
+
+    def __len__(self):
+        return len(self.items)
+
+
+def cycleEdge(adj, start):
+    '''
+    Find an edge on a cycle of the component of start, None if the component is a tree.
+    Removing such an edge does not disconnect the component.
+    '''
+    parent = {start: None}
+    stack = [start]
+    while stack:
+        u = stack.pop()
+        for v in adj[u]:
+            if v not in parent:
+                parent[v] = u
+                stack.append(v)
+            elif v != parent[u]:
+                return u, v
+    return None
+
+
+def generate_network(ctx, n, zo, z1): #p2p network connection
+    '''
+    Function to generate the network of peers and the adjacency of the network.
+    Every peer gets a target degree in [MIN_DEGREE, MAX_DEGREE] and the targets are paired at random,
+    peers still short of their target are then linked to peers picked from degree buckets, lowest first,
+    and the few left below MIN_DEGREE to the peers with the most spare degree.
+    Components are tracked with union-find and merged by swapping edges, which keeps the degrees,
+    so the graph is built once in near linear time instead of retried until it is connected.
+    The adjacency is returned in CSR form (indptr, indices).
+    '''
+    rng = ctx.network_gen
+    Peers = get_Peers(ctx, n, zo, z1)
+    adj = [set() for i in range(n)]
+    components = DisjointSet(n)
+    # buckets[d] holds the nodes with degree d that can still take a neighbour
+    buckets = [NodePool() for d in range(MAX_DEGREE)]
+    for x in range(n):
+        buckets[0].add(x)
+
+    def link(x, y):
+        for node in (x, y):
+            degree = len(adj[node])
+            buckets[degree].remove(node)
+            if degree + 1 < MAX_DEGREE:
+                buckets[degree + 1].add(node)
+        adj[x].add(y)
+        adj[y].add(x)
+        components.union(x, y)
+
+    # pair the target degrees at random
+    target = rng.integers(MIN_DEGREE, MAX_DEGREE + 1, size=n)
+    stubs = np.repeat(np.arange(n), target)
+    rng.shuffle(stubs)
+    for x, y in zip(stubs[0::2].tolist(), stubs[1::2].tolist()):
+        if x != y and y not in adj[x]:
+            link(x, y)
+
+    # fill the peers short of their target from the lowest degree buckets
+    for x in rng.permutation(n).tolist():
+        while len(adj[x]) < target[x]:
+            for bucket in buckets:
+                found = False
+                for attempt in range(min(len(bucket), 8)):
+                    y = bucket.pick(rng)
+                    if y != x and y not in adj[x]:
+                        link(x, y)
+                        found = True
+                        break
+                if found:
+                    break
+            else:
+                break
+
+    # the random picks can leave a peer below MIN_DEGREE, link it to the non-neighbour with the most
+    # spare degree, or when they are all full swap an edge (y, z) of one of them for (x, y) and (x, z)
+    low = min(MIN_DEGREE, n - 1)
+    for x in range(n):
+        while len(adj[x]) < low:
+            y = min((y for y in range(n) if y != x and y not in adj[x]), key=lambda y: (len(adj[y]), y))
+            if len(adj[y]) < MAX_DEGREE:
+                adj[x].add(y)
+                adj[y].add(x)
+            else:
+                z = min(z for z in adj[y] if z not in adj[x])
+                adj[y].discard(z)
+                adj[z].discard(y)
+                adj[x].update((y, z))
+                adj[y].add(x)
+                adj[z].add(x)
+            components.union(x, y)
+
+    # merge every other component into the largest one
+    members = {}
+    for x in range(n):
+        members.setdefault(components.find(x), []).append(x)
+    giant = max(members.values(), key=len)
+    for comp in members.values():
+        if comp is giant:
+            continue
+        edge = cycleEdge(adj, comp[0])
+        if edge is not None:
+            # swap (a, b) in the component and (c, d) in the giant for (a, c) and (b, d)
+            a, b = edge
+            c = giant[rng.integers(len(giant))]
+            d = sorted(adj[c])[rng.integers(len(adj[c]))]
+            adj[a].discard(b)
+            adj[b].discard(a)
+            adj[c].discard(d)
+            adj[d].discard(c)
+            adj[a].add(c)
+            adj[c].add(a)
+            adj[b].add(d)
+            adj[d].add(b)
+        else:
+            a = next(x for x in comp if len(adj[x]) < MAX_DEGREE)
+            c = next(x for x in giant if len(adj[x]) < MAX_DEGREE)
+            adj[a].add(c)
+            adj[c].add(a)
+        components.union(comp[0], giant[0])
+        giant.extend(comp)
+
+    assert all(low <= len(nbrs) <= MAX_DEGREE for nbrs in adj), "peer degree out of bounds"
+
+    # neighbours in id order, so broadcasts do not depend on object addresses
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indices = []
+    for peer in Peers:
+        nbrs = sorted(adj[peer.unique_id])
+        peer.neighbors = tuple(Peers[j] for j in nbrs)
+        indices.extend(nbrs)
+        indptr[peer.unique_id + 1] = indptr[peer.unique_id] + len(nbrs)
+    ctx.latency = LatencyModel(Peers, ctx.spawnRng())
+    return Peers, (indptr, np.array(indices, dtype=np.int64))
+
+
+def to_networkx(adjacency):
     '''
-    Function to generate the network of peers and Graph of the network.
+    networkx Graph of a CSR adjacency (indptr, indices).
     '''
+    import networkx as nx
+    indptr, indices = adjacency
     Graph = nx.Graph()
-    Graph.add_nodes_from(range(n))
-    Peers = [None] *n
-    Peers = get_Peers(n, zo, z1)
-
-    while not nx.is_connected(Graph):
-        Graph = nx.Graph()
-        Graph.add_nodes_from(range(n))
-        # reset nodes
-        for peer in Peers:
-            peer.neighbors = set()
-        # generate random connections
-        for nodeX in range(n):
-            l = random_gen.integers(3, 7) #random number of peers
-            # check for number of neighbors for nodeX in the graph
-            while Graph.degree[nodeX] < l:
-                nodeY = random_gen.choice([j for j in range(n) if j != nodeX and j not in Graph.neighbors(nodeX)])  
-                
-                if Graph.degree[nodeY] < 6:
-                    connection(nodeX, nodeY, Peers, Graph)
-
-    return Peers, Graph
-
-    #adding edges of the peer graph
-def connection(nodeX, nodeY, Peers, Graph):
-    '''
-    Connect the Peers in the Network if not already connected 
-    '''
-
-    if(nodeX not in Graph.neighbors( nodeY)):
-        Graph.add_edge(nodeX, nodeY)
-        Graph.add_edge(nodeY, nodeX)
-        Peers[nodeX].neighbors.add(Peers[nodeY])
-        Peers[nodeY].neighbors.add(Peers[nodeX])
+    Graph.add_nodes_from(range(len(indptr) - 1))
+    for x in range(len(indptr) - 1):
+        Graph.add_edges_from((x, y) for y in indices[indptr[x]:indptr[x + 1]].tolist())
+    return Graph
 
 def print_graph(Graph):
     '''
-    Visualize the Network Graph
+    Visualize the Network Graph, Graph is the CSR adjacency of the network.
     '''
-    plt.figure()
-    nx.draw(Graph, with_labels=True)
-    plt.savefig('./BlockChain_Network_Connections.png')
\ No newline at end of file
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import networkx as nx
+    fig = plt.figure()
+    nx.draw(to_networkx(Graph), with_labels=True)
+    fig.savefig('./BlockChain_Network_Connections.png')
+    plt.close(fig)
\ No newline at end of file
@@ -0,0 +1,128 @@
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+
+from main import Simulator
+from utils.context import SimulationContext
+from utils.definitions import RELAY_MODES
+from utils import termination
+
+
+'''
+Parameter sweep over the simulator.
+Every combination of the parameter grids is run replicates times on a process pool and
+the metrics of each run (the values printDetails computes) are streamed into one CSV file.
+Replicate r of every grid point uses seed + r, so grid points are compared on common random numbers.
+'''
+
+PARAMS = ['n', 'z0', 'z1', 'ttx', 'I', 'relay', 'depth']
+TYPES = ['low_slow', 'high_slow', 'low_fast', 'high_fast']
+FIELDS = PARAMS + ['replicate', 'seed', 'longest_chain', 'total_blocks', 'propagation_delay', 'stale_rate', 'forks'] + ['ratio_' + type for type in TYPES] + ['stopped_by', 'wall_time', 'error']
+
+
+def runSimulation(job):
+    '''
+    Run a single simulation and return its CSV row.
+    '''
+    params, replicate, seed, block_limit, stop_when = job
+    ctx = SimulationContext(seed)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        sim = Simulator(params['n'], params['z0'], params['z1'], params['ttx'], params['I'], block_limit=block_limit, ctx=ctx, relay=params['relay'], stop_when=stop_when, confirmation_depth=params['depth'])
+        sim.simulate()
+    metrics = sim.computeMetrics()
+
+    row = dict(params)
+    row['replicate'] = replicate
+    row['seed'] = seed
+    row['longest_chain'] = metrics['longest_chain']
+    row['total_blocks'] = metrics['total_blocks']
+    for field in ('propagation_delay', 'stale_rate', 'forks'):
+        row[field] = metrics[field]
+    for type in TYPES:
+        row['ratio_' + type] = metrics['average_type_ratios'][type]
+    row['stopped_by'] = sim.stopped_by
+    row['wall_time'] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def runOne(job):
+    '''
+    CSV row of a job, run in a worker. A run that raises still gives a row, with stopped_by "error" and
+    the exception in error, so one bad replicate does not abort the runs queued behind it.
+    '''
+    params, replicate, seed = job[:3]
+    try:
+        return runSimulation(job)
+    except Exception as e:
+        row = dict(params)
+        row['replicate'] = replicate
+        row['seed'] = seed
+        row['stopped_by'] = 'error'
+        row['error'] = f"{e.__class__.__name__}: {e}"
+        return row
+
+
+def getJobs(grid, replicates, seed, block_limit, stop_when):
+    jobs = []
+    for values in itertools.product(*(grid[param] for param in PARAMS)):
+        params = dict(zip(PARAMS, values))
+        for replicate in range(replicates):
+            jobs.append((params, replicate, seed + replicate, block_limit, stop_when))
+    return jobs
+
+
+def sweep(grid, replicates, output, seed = 0, block_limit = 20, workers = None, stop_when = ()):
+    '''
+    Fan the runs out over a process pool and write each row to output as soon as it is done.
+    stop_when are termination predicates (utils.termination) applied to every run.
+    '''
+    jobs = getJobs(grid, replicates, seed, block_limit, stop_when)
+    with open(output, 'w', newline='') as f, Pool(workers or os.cpu_count()) as pool:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        failed = 0
+        for done, row in enumerate(pool.imap_unordered(runOne, jobs), 1):
+            writer.writerow(row)
+            f.flush()
+            if row['stopped_by'] == 'error':
+                failed += 1
+            print(f"\r{done}/{len(jobs)} runs", end='', file=sys.stderr)
+    print(file=sys.stderr)
+    if failed:
+        print(f"{failed} runs failed, see the error column of {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Parameter sweep of the Cryptocurrency Simulator')
+    parser.add_argument('-n', '--num_nodes', nargs='+', default=[10], type=int, help='Num Nodes')
+    parser.add_argument('-z0', '--percent_slow', nargs='+', default=[50], type=float, help=" %  of slow nodes")
+    parser.add_argument('-z1', '--percent_lowCPU', nargs='+', default=[50], type=float, help='percentage of nodes having low CPU power')
+    parser.add_argument('-ttx', '--mean_inter_arrival', nargs='+', default=[10], type=float, help='mean inter-arrival time between transactions')
+    parser.add_argument('-I', '--average_block_mining_time', nargs='+', default=[100], type=float, help='average time taken to mine a block')
+    parser.add_argument('--relay', nargs='+', default=['full'], choices=RELAY_MODES, help='relay modes')
+    parser.add_argument('--confirmation_depth', nargs='+', default=[6], type=int, help='depths at which the peers forget the transactions of a block')
+    parser.add_argument('-r', '--replicates', default=1, type=int, help='runs per grid point')
+    parser.add_argument('--seed', default=0, type=int, help='seed of the first replicate')
+    parser.add_argument('--block_limit', default=20, type=int, help='blocks after which a run stops, 0 for no limit')
+    parser.add_argument('-j', '--workers', default=None, type=int, help='worker processes (default: all cores)')
+    parser.add_argument('-o', '--output', default='./sweep.csv', help='output CSV file')
+    termination.addArguments(parser)
+    args = parser.parse_args()
+
+    grid = {
+        'n': args.num_nodes,
+        'z0': args.percent_slow,
+        'z1': args.percent_lowCPU,
+        'ttx': args.mean_inter_arrival,
+        'I': args.average_block_mining_time,
+        'relay': args.relay,
+        'depth': args.confirmation_depth,
+    }
+    sweep(grid, args.replicates, args.output, seed=args.seed, block_limit=args.block_limit or None, workers=args.workers,
+          stop_when=termination.fromArguments(args))
@@ -0,0 +1,82 @@
+import io
+import os
+import sys
+import unittest
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Simulator
+from utils import termination
+from utils.context import SimulationContext
+from utils.definitions import Block, Event, Transaction, BLK_REC
+from utils.profiling import Profiler
+
+
+def simulator(stop_when = (), sim_Time = None):
+    return Simulator(10, 50, 50, 10, 30, sim_Time=sim_Time, block_limit=None, ctx=SimulationContext(1), stop_when=stop_when)
+
+
+def simulate(sim):
+    with redirect_stdout(io.StringIO()):
+        sim.simulate()
+
+
+class TerminationTest(unittest.TestCase):
+    def test_sim_time(self):
+        sim = simulator(sim_Time=50)
+        simulate(sim)
+        self.assertEqual(sim.stopped_by, 'sim_time')
+        self.assertGreater(sim.ctx.EventList.peek()[0], 50)
+
+    def test_blocks_mined(self):
+        sim = simulator([termination.BlocksMined(5)])
+        simulate(sim)
+        self.assertEqual(sim.stopped_by, 'max_blocks')
+        self.assertEqual(sim.ctx.total_blocks() - 1, 5)
+
+    def test_event_budget(self):
+        '''
+        Exactly max_events events are handled, by every call to simulate.
+        '''
+        sim = simulator([termination.EventBudget(100)])
+        profiler = Profiler()
+        for _ in range(2):
+            with profiler.profile(sim):
+                simulate(sim)
+            self.assertEqual(sim.stopped_by, 'max_events')
+        self.assertEqual(sum(profiler.counts), 200)
+
+    def test_wall_clock(self):
+        sim = simulator([termination.WallClock(0, every=1)])
+        simulate(sim)
+        self.assertEqual(sim.stopped_by, 'wall_time')
+
+    def test_chain_quorum(self):
+        sim = simulator([termination.ChainQuorum(4, 0.5)])
+        simulate(sim)
+        self.assertEqual(sim.stopped_by, 'quorum')
+        lengths = [peer.blockchain.long_Block.length for peer in sim.Peers]
+        self.assertGreaterEqual(sum(length >= 4 for length in lengths), 5)
+
+    def test_chain_quorum_on_last_event(self):
+        '''
+        A quorum reached by the last event before the EventList runs out still stops the run.
+        '''
+        sim = simulator([termination.ChainQuorum(2, 0.1)])
+        sim.seeded = True
+        receiver, creator = sim.Peers[0], sim.Peers[1]
+        # the only neighbour of the receiver is the creator, so the block is not relayed any further
+        receiver.neighbors = (creator,)
+        with redirect_stdout(io.StringIO()):
+            block = Block(sim.ctx, 1, 0, creator, Transaction(sim.ctx, peer1=creator, amount=50, timestamp=1, is_coinbase=True))
+        block.setTxns([])
+        sim.ctx.EventList.push(2, Event(2, BLK_REC, sender=creator, receiver=receiver, block=block))
+        simulate(sim)
+        self.assertFalse(sim.ctx.EventList)
+        self.assertEqual(receiver.blockchain.long_Block.length, 2)
+        self.assertEqual(sim.stopped_by, 'quorum')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import argparse
+import math
+import numpy as np
+
+'''
+Arrival times of the blocks at the peers and the propagation analytics computed from them.
+All the peers write into one ArrivalMatrix, saved as a single .npz by Simulator.saveArrivals
+together with the creation time and creator of every block and the class masks of the peers.
+
+Usage:
+python -m utils.arrivals ./observations/Results/arrival_times.npz
+'''
+
+PERCENTILES = (50, 90, 99)
+COVERAGES = (0.5, 0.9, 1.0)
+
+
+class ArrivalMatrix:
+    '''
+    Arrival time of every block at every peer in a peers x blocks matrix, nan where the block did not arrive.
+    Rows and columns are allocated ahead and the capacity doubles when a peer or block id runs past it.
+    num_blocks is one more than the highest block id set so far.
+    '''
+
+    def __init__(self, n = 0, capacity = 64):
+        self.times = np.full((n, capacity), np.nan)
+        self.num_peers = n
+        self.num_blocks = 0
+
+    def grow(self, rows, columns):
+        old_rows, old_columns = self.times.shape
+        rows = max(rows, 2 * old_rows) if rows > old_rows else old_rows
+        columns = max(columns, 2 * old_columns) if columns > old_columns else old_columns
+        times = np.full((rows, columns), np.nan)
+        times[:old_rows, :old_columns] = self.times
+        self.times = times
+
+    def set(self, peer_id, blkid, time_s):
+        rows, columns = self.times.shape
+        if peer_id >= rows or blkid >= columns:
+            self.grow(peer_id + 1, blkid + 1)
+        self.times[peer_id, blkid] = time_s
+        if peer_id >= self.num_peers:
+            self.num_peers = peer_id + 1
+        if blkid >= self.num_blocks:
+            self.num_blocks = blkid + 1
+
+    def clear(self, peer_id, blkid):
+        self.times[peer_id, blkid] = np.nan
+
+    def row(self, peer_id):
+        return self.times[peer_id, :self.num_blocks]
+
+    def matrix(self, num_blocks = None):
+        '''
+        View of the used part of the matrix, padded with nan upto num_blocks columns.
+        '''
+        num_blocks = self.num_blocks if num_blocks is None else num_blocks
+        if num_blocks > self.times.shape[1]:
+            self.grow(self.num_peers, num_blocks)
+        return self.times[:self.num_peers, :num_blocks]
+
+
+def reachDelays(times, created, coverages = COVERAGES):
+    '''
+    Time for every block to reach each fraction of the peers in coverages, one row per coverage,
+    nan for the blocks that did not reach it.
+    '''
+    n = times.shape[0]
+    ranks = [max(math.ceil(coverage * n) - 1, 0) for coverage in coverages]
+    # nan sorts last, so a rank past the peers a block reached gives nan
+    reached = np.sort(times, axis=0)[ranks]
+    return reached - created
+
+
+def delayPercentiles(times, created, coverages = COVERAGES, percentiles = PERCENTILES):
+    '''
+    {coverage: {percentile: delay}} over the blocks, of the time taken to reach coverage of the peers.
+    The genesis block is left out, percentiles are None when no block reached the coverage.
+    '''
+    delays = reachDelays(times[:, 1:], created[1:], coverages)
+    result = {}
+    for coverage, row in zip(coverages, delays):
+        row = row[~np.isnan(row)]
+        values = np.percentile(row, percentiles).tolist() if len(row) else [None] * len(percentiles)
+        result[coverage] = dict(zip(percentiles, values))
+    return result
+
+
+def classDelays(times, created, creators, classes, percentiles = PERCENTILES):
+    '''
+    {label: {percentile: delay}} of the delay between the creation of a block and its arrival at the
+    peers of each class, classes maps a label to a boolean mask over the peers.
+    Arrivals of blocks at their own creator and the genesis block are left out.
+    '''
+    delays = times[:, 1:] - created[1:]
+    creators = creators[1:]
+    mined = np.flatnonzero(creators >= 0)
+    delays[creators[mined], mined] = np.nan
+    result = {}
+    for label, mask in classes.items():
+        values = delays[np.asarray(mask, dtype=bool)]
+        values = values[~np.isnan(values)]
+        result[label] = dict(zip(percentiles, np.percentile(values, percentiles).tolist() if len(values) else [None] * len(percentiles)))
+    return result
+
+
+def saveArrivals(path, times, created, creators, classes):
+    '''
+    Save the matrix, the creation time and creator of every block and the class masks in one .npz.
+    '''
+    np.savez_compressed(path, arrivals=times, created=created, creators=creators,
+                        **{'class_' + label: np.asarray(mask, dtype=bool) for label, mask in classes.items()})
+
+
+def loadArrivals(path):
+    '''
+    (times, created, creators, classes) saved by saveArrivals.
+    '''
+    with np.load(path) as data:
+        classes = {key[len('class_'):]: data[key] for key in data.files if key.startswith('class_')}
+        return data['arrivals'], data['created'], data['creators'], classes
+
+
+def report(times, created, creators, classes):
+    '''
+    Lines of text with the propagation percentiles, printed by printDetails and the command line.
+    '''
+    lines = ["Time for a block to reach a fraction of the peers, percentiles over the blocks (" + ", ".join(f"p{p}" for p in PERCENTILES) + "):"]
+    for coverage, values in delayPercentiles(times, created).items():
+        lines.append(f"  {coverage:.0%} of the peers: " + ", ".join(str(None if value is None else round(value, 3)) for value in values.values()))
+    lines.append("Delay from creation to arrival at a peer, by class of the peer:")
+    for label, values in classDelays(times, created, creators, classes).items():
+        lines.append(f"  {label}: " + ", ".join(str(None if value is None else round(value, 3)) for value in values.values()))
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Propagation analytics of a saved arrival matrix')
+    parser.add_argument('path', help='.npz written by Simulator.saveArrivals')
+    args = parser.parse_args()
+    print("\n".join(report(*loadArrivals(args.path))))
@@ -0,0 +1,43 @@
+import numpy as np
+from utils.blocktree import growTo
+
+
+class Bitset:
+    '''
+    Growable set of non negative integers stored one bit each, used for the txids a peer has seen.
+    '''
+
+    def __init__(self):
+        self.bits = bytearray()
+
+    def add(self, x):
+        '''
+        Add x, returns False if it was already present.
+        '''
+        byte, mask = x >> 3, 1 << (x & 7)
+        growTo(self.bits, byte + 1, 0)
+        if self.bits[byte] & mask:
+            return False
+        self.bits[byte] |= mask
+        return True
+
+    def __contains__(self, x):
+        byte = x >> 3
+        return byte < len(self.bits) and self.bits[byte] & (1 << (x & 7)) != 0
+
+    def containsMany(self, ids):
+        '''
+        Boolean array telling which of the ids are present.
+        '''
+        ids = np.asarray(ids, dtype=np.int64)
+        present = np.zeros(len(ids), dtype=bool)
+        byte = ids >> 3
+        inside = byte < len(self.bits)
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        present[inside] = (bits[byte[inside]] >> (ids[inside] & 7)) & 1 == 1
+        # release the view, a bytearray with an exported buffer cannot grow
+        del bits
+        return present
+
+    def __len__(self):
+        return sum(bin(byte).count('1') for byte in self.bits)
@@ -0,0 +1,102 @@
+from array import array
+
+
+def growTo(column, size, fill):
+    '''
+    Extend an array or bytearray column to at least size entries, doubling it.
+    '''
+    extra = size - len(column)
+    if extra > 0:
+        extra = max(extra, len(column))
+        if isinstance(column, bytearray):
+            column.extend(bytes([fill]) * extra)
+        else:
+            column.extend(array(column.typecode, [fill]) * extra)
+
+
+class BlockStore:
+    '''
+    Simulation wide table of the blocks, indexed by block id. Blocks are shared by all the peers,
+    the peers only keep which of them they know.
+    Contains the following attributes:
+    blocks : Block of every id, None for ids not created yet.
+    parent : Parent block id of every block, -1 for the genesis.
+    height : Height of every block above the genesis.
+    creator : unique_id of the creator of every block, -1 for the genesis.
+    first_child, next_sibling : Children of a block as a linked list of offsets into the same arrays.
+    '''
+
+    def __init__(self):
+        self.blocks = []
+        self.parent = array('i')
+        self.height = array('i')
+        self.creator = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+
+    def add(self, block):
+        blkid = block.id
+        if blkid >= len(self.blocks):
+            self.blocks.extend([None] * (blkid + 1 - len(self.blocks)))
+        for column in (self.parent, self.height, self.creator, self.first_child, self.next_sibling):
+            growTo(column, blkid + 1, -1)
+        self.blocks[blkid] = block
+        if block.pblk is None:
+            self.height[blkid] = 0
+            return
+        self.parent[blkid] = block.pblkid
+        self.height[blkid] = self.height[block.pblkid] + 1
+        self.creator[blkid] = block.creator.unique_id
+        self.next_sibling[blkid] = self.first_child[block.pblkid]
+        self.first_child[block.pblkid] = blkid
+
+    def __getitem__(self, blkid):
+        return self.blocks[blkid]
+
+    def __len__(self):
+        return len(self.blocks)
+
+
+class BlockTree:
+    '''
+    Tree of the blocks known to a peer. The shape of the tree lives in the shared BlockStore,
+    a peer only keeps a byte per block id in present and the number of edges, so size() is O(1).
+    '''
+
+    def __init__(self, store, root = 0):
+        self.store = store
+        self.root = root
+        self.present = bytearray()
+        self.num_edges = 0
+        growTo(self.present, root + 1, 0)
+        self.present[root] = 1
+
+    def addBlock(self, pblkid, blkid):
+        '''
+        Add the block blkid as a child of pblkid.
+        '''
+        growTo(self.present, max(pblkid, blkid) + 1, 0)
+        if self.present[blkid]:
+            return
+        self.present[pblkid] = 1
+        self.present[blkid] = 1
+        self.num_edges += 1
+
+    def __contains__(self, blkid):
+        return blkid < len(self.present) and self.present[blkid] == 1
+
+    def __len__(self):
+        return self.num_edges + 1
+
+    def size(self):
+        '''
+        Number of edges in the tree, same as DiGraph.size().
+        '''
+        return self.num_edges
+
+    def nodes(self):
+        return [blkid for blkid, known in enumerate(self.present) if known]
+
+    def edges(self):
+        parent = self.store.parent
+        return [(parent[blkid], blkid) for blkid in self.nodes() if blkid != self.root]
@@ -0,0 +1,68 @@
+from numpy.random import default_rng, SeedSequence
+from utils.scheduler import EventQueue
+from utils.output import OutputWriter
+from utils.blocktree import BlockStore
+from utils.arrivals import ArrivalMatrix
+
+
+class SimulationContext:
+    '''
+    SimulationContext holds all the mutable state of one simulation run, so that many
+    simulations can run back to back in the same process.
+    Contains the following attributes:
+    seed : Seed of the run, every random stream is derived from it. The inter-arrival and
+           mining distributions each take their own stream from spawnRng.
+    EventList : Contains all the events in the network.
+    blockId : ID given to the next Block created.
+    txID : ID given to the next Transaction created.
+    blocks : BlockStore of all the blocks created in the run, indexed by block id.
+    arrivals : ArrivalMatrix of the arrival time of every block at every peer.
+    random_gen : Random generator used by the peers (neighbour choice, transaction amounts).
+    network_gen : Random generator used to build the network.
+    latency : LatencyModel of the network, set by generate_network.
+    log_transactions : Write the transaction logs in ./observations/Transactions, set by the Simulator.
+    output : OutputWriter all the observation files are written through.
+    trace : TraceWriter of the binary event trace, None when tracing is off.
+    relay_mode : How blocks and transactions are relayed, one of definitions.RELAY_MODES.
+    confirmation_depth : Depth in the longest chain at which the peers forget the transactions of a block.
+    traffic : Modelled data sent per kind of message (txn, block, inv, getdata), in the units of the message sizes.
+    chain_metrics : ChainMetrics updated by the peers when their longest chain changes, set by the Simulator.
+    '''
+
+    def __init__(self, seed = 0):
+        self.seed = seed
+        self.seed_seq = SeedSequence(seed)
+        self.EventList = EventQueue()
+        self.blockId = 1
+        self.txID = 10
+        self.blocks = BlockStore()
+        self.arrivals = ArrivalMatrix()
+        self.random_gen = self.spawnRng()
+        self.network_gen = self.spawnRng()
+        self.latency = None
+        self.log_transactions = True
+        self.output = OutputWriter()
+        self.trace = None
+        self.relay_mode = "full"
+        self.confirmation_depth = 6
+        self.traffic = dict.fromkeys(("txn", "block", "inv", "getdata"), 0.0)
+        self.chain_metrics = None
+
+    def spawnRng(self):
+        '''
+        Return a new Generator with its own reproducible stream derived from the seed.
+        '''
+        return default_rng(self.seed_seq.spawn(1)[0])
+
+    def nextBlockId(self):
+        blkid = self.blockId
+        self.blockId += 1
+        return blkid
+
+    def nextTxId(self):
+        txid = self.txID
+        self.txID += 1
+        return txid
+
+    def total_blocks(self):
+        return self.blockId
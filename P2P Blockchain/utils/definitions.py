@@ -1,16 +1,60 @@
-from queue import PriorityQueue 
-from numpy.random import default_rng
-import networkx as nx
-from utils.generators import getLatency
+import numpy as np
+from utils.blocktree import BlockTree, growTo
+from utils.mempool import Mempool
+from utils.bitset import Bitset
 from collections import deque
 
 #Global variables
 
-EventList = PriorityQueue() # Contains all the events in the network.
-seed = 0
-random_gen = default_rng(seed)
-Ttx = 10
 maxTransactions = 100
+balanceCheckpoint = 16 # every balanceCheckpoint-th block stores the full balances
+maxOrphans = None # cap on the orphan blocks kept by a peer, oldest are evicted first. None for no cap
+
+# Integer event codes, used as indices into the Simulator handler table.
+TX_GEN, TX_REC, BLK_GEN, BLK_REC, INV_REC, GETDATA_REC = range(6)
+EVENT_NAMES = ("Transaction_Gen", "Transaction_Rec", "Block_Gen", "Block_Rec", "Inv_Rec", "GetData_Rec")
+
+# Relay modes: "full" pushes every payload to all the neighbours, "inv" announces it with an INV
+# and the receiver fetches the payload with a GETDATA from the first announcer only, "compact" pushes
+# blocks as a header with short transaction ids plus the transactions the receiver has not seen.
+RELAY_MODES = ("full", "inv", "compact")
+invMessage = 0.036 # size of an INV or GETDATA, a transaction is 1 and a block len(txns) in the same units
+headerMessage = 0.08 # size of a block header
+shortIdMessage = 0.006 # size of a short transaction id of a compact block
+
+
+def itemKey(txn, block):
+    '''
+    Key of a relayed item, the txid of a transaction and -1 - id of a block so the two never collide.
+    '''
+    if txn is not None:
+        return txn.txid
+    return -1 - block.id
+
+
+def txnArrays(txns):
+    '''
+    Turn a list of transactions into payer, payee and amount arrays.
+    A coinbase has no payer, it is stored with payer -1 and the miner as payee.
+    '''
+    count = len(txns)
+    payers = np.fromiter((-1 if txn.peer2 is None else txn.peer1.unique_id for txn in txns), dtype=np.int64, count=count)
+    payees = np.fromiter((txn.peer1.unique_id if txn.peer2 is None else txn.peer2.unique_id for txn in txns), dtype=np.int64, count=count)
+    amounts = np.fromiter((txn.amount for txn in txns), dtype=np.int64, count=count)
+    return payers, payees, amounts
+
+
+def netDeltas(payers, payees, amounts):
+    '''
+    Net balance change of every touched peer, returned as sorted peer ids and their deltas.
+    '''
+    paid = payers >= 0
+    ids = np.concatenate((payees, payers[paid]))
+    vals = np.concatenate((amounts, -amounts[paid]))
+    ids, inverse = np.unique(ids, return_inverse=True)
+    deltas = np.zeros(len(ids), dtype=np.int64)
+    np.add.at(deltas, inverse, vals)
+    return ids, deltas
 
 
 
@@ -19,25 +63,32 @@ class Peer:
     '''
     Class Peer to represent the peer in the network.
     Contains the following attributes:
+    ctx : SimulationContext the peer belongs to.
     unique_id : Unique ID of the peer.
     slow : Boolean value to represent if the peer is slow or not.
     low_CPU : Boolean value to represent if the peer has low CPU or not.
     balance : Balance in the account of the peer.
-    pushed_txns : Set of transactions which are already pushed into a blockChain
-    pending_txns : Set of transactions which are not already in a blockChain 
+    pending_txns : Mempool of transactions which are not already in a blockChain 
+    seen_txns : Bitset of the txids the peer has created or relayed, every transaction is relayed at most once.
+    suppressed_txns : Number of duplicate transactions received and not relayed again.
+    inflight : Items requested with a GETDATA and not received yet, by itemKey.
     neighbors : List of neighbors of the peer.
     blockchain : Blockchain of the peer.
     num_blks : Number of blocks created by the peer.
     blocksCreated : Set of blocks created by the peer.
     '''
 
-    def __init__(self, unique_id, slow = False, low_CPU = False, balance = 200 , neighbors = [], gensis = None):
+    def __init__(self, ctx, unique_id, slow = False, low_CPU = False, balance = 200 , neighbors = [], gensis = None):
+        self.ctx = ctx
         self.unique_id = unique_id
         self.slow = slow 
         self.low_CPU = low_CPU 
         self.balance = balance # Balance in the account of the peer.
-        self.pushed_txns = set() # Transacxtions which are already pushed into a block.
-        self.pending_txns = set() # Transactions which are not already in a block.
+        self.pending_txns = Mempool() # Transactions which are not already in a block.
+        self.seen_txns = Bitset()
+        self.suppressed_txns = 0
+        self.inflight = {} # item key -> peer the payload was requested from, in inv relay mode
+        self.buried = gensis # tip of the chain whose transactions are already forgotten.
         self.neighbors = neighbors
         self.blockchain = BlockChain(self, gensis) # Blockchain of the peer.
         self.num_blks = 0 
@@ -53,27 +104,25 @@ class Peer:
         if self.balance <= 1:
             return
         time_s = event.timestamp
-        random_neighbor = random_gen.choice(list(self.neighbors))
-        txn_amount = random_gen.integers(1,self.balance)//10
+        random_neighbor = self.ctx.random_gen.choice(list(self.neighbors))
+        txn_amount = self.ctx.random_gen.integers(1,self.balance)//10
 
         # create Transaction only if the txn_amount is less than the balance of the peer in blockChain. 
         if txn_amount < self.balance:
-            txn = Transaction(peer1=self,peer2=random_neighbor, amount=txn_amount, timestamp=time_s)
-            with open(f'./observations/Transactions/peer_{self.unique_id}_Transactions.txt', 'a') as f:
-                f.write(f"{txn.txid}: {txn.peer1.unique_id} pays {txn.peer2.unique_id} {txn.amount} coins \n")
-            with open(f'./observations/Transactions/All_Transactions.txt', 'a') as f:
-                f.write(f"{txn.txid}: {txn.peer1.unique_id} pays {txn.peer2.unique_id} {txn.amount} coins \n")
+            txn = Transaction(self.ctx, peer1=self,peer2=random_neighbor, amount=txn_amount, timestamp=time_s)
+            if self.ctx.log_transactions:
+                line = f"{txn.txid}: {txn.peer1.unique_id} pays {txn.peer2.unique_id} {txn.amount} coins \n"
+                self.ctx.output.write(f'./observations/Transactions/peer_{self.unique_id}_Transactions.txt', line)
+                self.ctx.output.write('./observations/Transactions/All_Transactions.txt', line)
+            if self.ctx.trace is not None:
+                self.ctx.trace.recordTxn(txn)
                 
             self.pending_txns.add(txn)
+            self.seen_txns.add(txn.txid)
             next_time = time_s + delta_t
-            EventList.put((next_time, Event(next_time, "Transaction_Gen", sender=self)))
+            self.ctx.EventList.push(next_time, Event(next_time, TX_GEN, sender=self))
 
-            for peer in self.neighbors:
-                if peer.unique_id == txn.peer1.unique_id or peer.unique_id == event.sender.unique_id:
-                    continue
-                message = 1 
-                latency = getLatency(self, peer, message)
-                EventList.put((time_s + latency, Event(time_s+latency, "Transaction_Rec", sender=self, receiver=peer, txn=txn)))
+            self.sendTransactionNeighbour(time_s, txn, event.sender)
 
     def receiveTransaction(self,event):
         '''
@@ -81,26 +130,111 @@ class Peer:
         '''
         time_s = event.timestamp
         txn = event.txn 
-        if txn not in self.pending_txns or txn in self.pushed_txns:
-            self.pending_txns.add(txn)
+        self.inflight.pop(itemKey(txn, None), None)
+        if not self.seen_txns.add(txn.txid):
+            self.suppressed_txns += 1
+            return
+        self.pending_txns.add(txn)
+        self.sendTransactionNeighbour(time_s, txn, event.sender)
 
-            for peer in self.neighbors:
-                if peer.unique_id == txn.peer1.unique_id or peer.unique_id == event.sender.unique_id:
-                    continue
-                message = 1 
-                latency = getLatency(self, peer, message)
-                EventList.put((time_s + latency, Event(time_s+latency, "Transaction_Rec", sender=self, receiver=peer, txn=txn)))
+    def sendTransactionNeighbour(self, time_s, txn, sender):
+        '''
+        function to send the transaction to the neighbors of the peer, except its creator and the peer it came from.
+        '''
+        if self.ctx.relay_mode == "inv":
+            self.announce(time_s, (txn.peer1.unique_id, sender.unique_id), txn=txn)
+            return
+        message = 1 
+        latencies = self.ctx.latency.broadcast(self, message).tolist()
+        broadcast = []
+        for peer, latency in zip(self.neighbors, latencies):
+            if peer.unique_id == txn.peer1.unique_id or peer.unique_id == sender.unique_id:
+                continue
+            broadcast.append((time_s + latency, Event(time_s+latency, TX_REC, sender=self, receiver=peer, txn=txn)))
+        self.ctx.EventList.push_many(broadcast)
+        self.ctx.traffic["txn"] += message * len(broadcast)
 
     def sendBlockNeighbour(self, time_s, block):
         '''
         function to send the block to the neighbors of the peer.
         '''
-        for peer in self.neighbors:
+        if self.ctx.relay_mode == "inv":
+            self.announce(time_s, (block.creator.unique_id,), block=block)
+            return
+        if self.ctx.relay_mode == "compact":
+            message = np.array([peer.compactSize(block) for peer in self.neighbors])
+            latencies = self.ctx.latency.broadcast(self, message).tolist()
+            sizes = message.tolist()
+            broadcast = []
+            for peer, latency, size in zip(self.neighbors, latencies, sizes):
+                if peer.unique_id == block.creator.unique_id:
+                    continue
+                broadcast.append((time_s + latency, Event(time_s+latency, BLK_REC, sender=self, receiver=peer, block=block)))
+                self.ctx.traffic["block"] += size
+            self.ctx.EventList.push_many(broadcast)
+            return
+        message = len(block.txns)
+        latencies = self.ctx.latency.broadcast(self, message).tolist()
+        broadcast = []
+        for peer, latency in zip(self.neighbors, latencies):
             if peer.unique_id == block.creator.unique_id:
                 continue
-            message = len(block.txns)
-            latency = getLatency(self, peer, message)
-            EventList.put((time_s + latency, Event(time_s+latency, "Block_Rec", sender=self, receiver=peer, block=block)))
+            broadcast.append((time_s + latency, Event(time_s+latency, BLK_REC, sender=self, receiver=peer, block=block)))
+        self.ctx.EventList.push_many(broadcast)
+        self.ctx.traffic["block"] += message * len(broadcast)
+
+    def compactSize(self, block):
+        '''
+        Size of block sent to this peer as a compact block, the transactions it has already seen are not sent again.
+        The coinbase is never seen before, it is sent in full as a prefilled transaction and the others as short ids.
+        '''
+        missing = len(block.txids) - int(np.count_nonzero(self.seen_txns.containsMany(block.txids)))
+        return headerMessage + shortIdMessage * len(block.txids) + 1 + missing
+
+    def announce(self, time_s, skip, txn=None, block=None):
+        '''
+        Send an INV of a transaction or a block to the neighbors, except the peers in skip.
+        '''
+        latencies = self.ctx.latency.broadcast(self, invMessage).tolist()
+        broadcast = []
+        for peer, latency in zip(self.neighbors, latencies):
+            if peer.unique_id in skip:
+                continue
+            broadcast.append((time_s + latency, Event(time_s+latency, INV_REC, sender=self, receiver=peer, txn=txn, block=block)))
+        self.ctx.EventList.push_many(broadcast)
+        self.ctx.traffic["inv"] += invMessage * len(broadcast)
+
+    def receiveInv(self, event):
+        '''
+        Request an announced item from the first peer announcing it, unless the peer already has it.
+        '''
+        txn = event.txn
+        block = event.block
+        if txn is not None:
+            known = txn.txid in self.seen_txns
+        else:
+            known = self.blockchain.seen(block.id)
+        key = itemKey(txn, block)
+        if known or key in self.inflight:
+            return
+        self.inflight[key] = event.sender
+        time_s = event.timestamp + self.ctx.latency.link(self, event.sender, invMessage)
+        self.ctx.EventList.push(time_s, Event(time_s, GETDATA_REC, sender=self, receiver=event.sender, txn=txn, block=block))
+        self.ctx.traffic["getdata"] += invMessage
+
+    def receiveGetData(self, event):
+        '''
+        Send the requested transaction or block to the peer asking for it.
+        '''
+        txn = event.txn
+        block = event.block
+        if txn is not None:
+            message, event_type, kind = 1, TX_REC, "txn"
+        else:
+            message, event_type, kind = len(block.txns), BLK_REC, "block"
+        time_s = event.timestamp + self.ctx.latency.link(self, event.sender, message)
+        self.ctx.EventList.push(time_s, Event(time_s, event_type, sender=self, receiver=event.sender, txn=txn, block=block))
+        self.ctx.traffic[kind] += message
 
 
 
@@ -109,45 +243,61 @@ class Peer:
         function to create a block by the peer check for the pending transactions and create a block.
         '''
         time_s = event.timestamp 
-        coinbase = Transaction(peer1=self, amount=50, timestamp=time_s, is_coinbase=True)
-        newBlock = Block(time_s, self.blockchain.long_Block.id, self, coinbase=coinbase, balances=self.blockchain.long_Block.balances)
+        coinbase = Transaction(self.ctx, peer1=self, amount=50, timestamp=time_s, is_coinbase=True)
+        newBlock = Block(self.ctx, time_s, self.blockchain.long_Block.id, self, coinbase=coinbase)
 
         self.blocksCreated.add(newBlock.id)
 
 
-        newBlock.balances[self.unique_id] += 50
-        with open(f'./observations/Transactions/peer_{self.unique_id}_Transactions.txt', 'a') as f:
-            f.write(f"{coinbase.txid}: {self.unique_id} mines 50 coins  \n")
-        with open(f'./observations/Transactions/All_Transactions.txt', 'a') as f:
-            f.write(f"{coinbase.txid}: {self.unique_id} mines 50 coins  \n")
-        transactions_to_remove = []
-
-        for txn in self.pending_txns:
-            if len(newBlock.txns) >= maxTransactions:
-                break
-            if txn.amount > newBlock.balances[txn.peer1.unique_id]:
-                continue
-            newBlock.balances[txn.peer1.unique_id] -= txn.amount
-            newBlock.balances[txn.peer2.unique_id] += txn.amount
-            newBlock.txns.append(txn)
-            self.pushed_txns.add(txn)
-            transactions_to_remove.append(txn)
-
-        # Remove the processed transactions from pending_txns after iteration
-        for txn in transactions_to_remove:
-            self.pending_txns.remove(txn)
-
-        self.balance = newBlock.balances[self.unique_id]
-        self.blockchain.id2blk[newBlock.id] = newBlock
-        self.blockchain.bcTree.add_edge(newBlock.pblkid, newBlock.id)
-        self.blockchain.arrival_time[newBlock.id] = time_s
-        self.blockchain.long_Block = newBlock
-        EventList.put((time_s + delta_t, Event(time_s + delta_t, "Block_Gen", generator=self)))
+        if self.ctx.log_transactions:
+            line = f"{coinbase.txid}: {self.unique_id} mines 50 coins  \n"
+            self.ctx.output.write(f'./observations/Transactions/peer_{self.unique_id}_Transactions.txt', line)
+            self.ctx.output.write('./observations/Transactions/All_Transactions.txt', line)
+        # Each sender's transactions are taken in arrival order while their running total stays
+        # within the sender's balance on the parent block.
+        senders = self.pending_txns.senders()
+        budgets = newBlock.pblk.balancesAt(senders)
+        budgets[np.asarray(senders, dtype=np.int64) == self.unique_id] += coinbase.amount
+        included = self.pending_txns.select(budgets.tolist(), maxTransactions - 1)
+
+        newBlock.setTxns(included)
+        for txn in included:
+            self.pending_txns.discard(txn)
+
+        self.balance = newBlock.balanceOf(self.unique_id)
+        self.blockchain.bcTree.addBlock(newBlock.pblkid, newBlock.id)
+        self.blockchain.setArrival(newBlock.id, time_s)
+        self.blockchain.setLongBlock(newBlock)
+        self.buryConfirmed()
+        self.ctx.EventList.push(time_s + delta_t, Event(time_s + delta_t, BLK_GEN, generator=self))
         # print(self.unique_id, " created block ", newBlock.id, " with parent ", newBlock.pblkid, " at time ", time_s, len(newBlock.txns), "at Peer ", self.unique_id)
         self.sendBlockNeighbour(time_s, newBlock)
         # print("Balances ", newBlock.balances)
 
 
+    def buryConfirmed(self):
+        '''
+        Forget the transactions of the blocks buried ctx.confirmation_depth deep in the longest chain,
+        they are dropped from pending_txns so the peer does not grow with the simulated time.
+        The blocks are buried from the fork point with the chain buried before, so after a reorg deeper
+        than the confirmation depth the blocks of the new branch are buried as well.
+        '''
+        target = self.blockchain.long_Block.length - self.ctx.confirmation_depth
+        if target <= 1:
+            return
+        top = self.blockchain.long_Block
+        while top.length > target:
+            top = top.pblk
+        block, buried = top, self.buried
+        while block is not buried:
+            if buried.length > block.length:
+                buried = buried.pblk
+                continue
+            for txn in block.txns[1:]:
+                self.pending_txns.discard(txn)
+            block = block.pblk
+        self.buried = top
+
     def receiveBlock(self, event):
         '''
         Check if current received Block has a parent in the blockchain. If not, add it to the orphan list.
@@ -156,26 +306,22 @@ class Peer:
         '''
         time_s = event.timestamp
         block = event.block
-        if block.id in self.blockchain.id2blk_orphan or block.id in self.blockchain.id2blk:
+        self.inflight.pop(itemKey(None, block), None)
+        if self.blockchain.seen(block.id):
             return
-        self.blockchain.arrival_time[block.id] = time_s
-        if block.pblkid not in self.blockchain.id2blk:
-            self.blockchain.id2blk_orphan[block.id] = block
+        self.blockchain.setArrival(block.id, time_s)
+        if not self.blockchain.isKnown(block.pblkid):
+            self.blockchain.addOrphan(block)
             return
 
-        # validate the transactions in the block by checking the balances with its parent block.
-        temp_balances = self.blockchain.id2blk[block.pblkid].balances.copy()
-
-        for txn in block.txns:
-            if txn.peer2 is None:
-                temp_balances[txn.peer1.unique_id] += txn.amount
-                continue
-            temp_balances[txn.peer1.unique_id] -= txn.amount
-            temp_balances[txn.peer2.unique_id] += txn.amount
+        # validate the transactions in the block, no balance may go negative over its parent block.
+        # the balance changes were computed from block.txns when the block was assembled
+        parent = block.pblk
+        ids, deltas = block.delta_ids, block.delta_vals
         
         # invalid block return 
-        if temp_balances != block.balances:
-            return 
+        if np.any(parent.balancesAt(ids) + deltas < 0):
+            return
         
         
 
@@ -185,31 +331,22 @@ class Peer:
         processOrphans.append(prevBlock)
         while len(processOrphans) > 0:
             blk = processOrphans.popleft()
-            self.blockchain.id2blk[blk.id] = blk
-            self.blockchain.arrival_time[prevBlock.id] = time_s
-            self.blockchain.bcTree.add_edge(blk.pblkid, blk.id)
+            self.blockchain.setArrival(prevBlock.id, time_s)
+            self.blockchain.bcTree.addBlock(blk.pblkid, blk.id)
             if blk.length > prevBlock.length:
                 prevBlock = blk
             self.sendBlockNeighbour(time_s, blk)
 
 
-            orphans_to_remove = []
-
-            for child in self.blockchain.id2blk_orphan.values():
-                if child.pblkid == blk.id:
-                    processOrphans.append(child)
-                    orphans_to_remove.append(child.id)
-
-            # Remove the orphan blocks from the dictionary after iteration
-            for orphan_id in orphans_to_remove:
-                self.blockchain.id2blk_orphan.pop(orphan_id)
+            processOrphans.extend(self.blockchain.popOrphans(blk.id))
         
         # check for fork in the blockchain
         if prevBlock.length > self.blockchain.long_Block.length:
             # if prevBlock.pblkid != self.blockchain.long_Block.id:
             #     print("Fork")
-            self.blockchain.long_Block = prevBlock
+            self.blockchain.setLongBlock(prevBlock)
             self.blockchain.len = prevBlock.length
+            self.buryConfirmed()
 
 
 
@@ -217,14 +354,107 @@ class Peer:
 
 
 class BlockChain: 
-    def __init__(self, creator, gen):
+    '''
+    Blockchain as seen by a peer. The blocks themselves live in the simulation wide ctx.blocks,
+    a peer only keeps a few bytes per block id:
+    bcTree : BlockTree of the known blocks, knowing block b is a byte test.
+    orphan : 1 for the blocks received before their parent.
+    arrivals : ctx.arrivals, the arrival times of the peer are its row unique_id, nan for the blocks that did not arrive.
+    Orphans are also indexed by the id of their missing parent in orphans_by_parent, so the
+    children of a new block are found directly, and queued in arrival order for eviction.
+    '''
+    def __init__(self, creator, gen, max_orphans=None):
         self.creator = creator
         self.long_Block = gen
-        self.id2blk_orphan = {}
-        self.id2blk = {gen.id: gen}
-        self.arrival_time = {gen.id: 0}
+        self.bcTree = BlockTree(creator.ctx.blocks, gen.id)
+        self.orphan = bytearray()
+        self.orphan_queue = deque()
+        self.orphans_by_parent = {}
+        self.num_orphans = 0
+        self.max_orphans = maxOrphans if max_orphans is None else max_orphans
+        self.orphans_evicted = 0
+        self.arrivals = creator.ctx.arrivals
+        self.setArrival(gen.id, 0)
         self.len = 1
-        self.bcTree = nx.DiGraph()
+
+    def setLongBlock(self, block):
+        '''
+        Move the tip of the longest chain to block and update ctx.chain_metrics.
+        '''
+        self.long_Block = block
+        chain_metrics = self.creator.ctx.chain_metrics
+        if chain_metrics is not None:
+            chain_metrics.switchTip(self.creator.unique_id, block.id)
+
+    def isKnown(self, blkid):
+        return blkid in self.bcTree
+
+    def isOrphan(self, blkid):
+        return blkid < len(self.orphan) and self.orphan[blkid] == 1
+
+    def seen(self, blkid):
+        '''
+        True if the block is already in the blockchain or waiting for its parent.
+        '''
+        return self.isKnown(blkid) or self.isOrphan(blkid)
+
+    def setArrival(self, blkid, time_s):
+        self.arrivals.set(self.creator.unique_id, blkid, time_s)
+
+    def arrivedBlocks(self):
+        '''
+        (block id, arrival time) of the blocks that arrived at the peer, in id order.
+        '''
+        row = self.arrivals.row(self.creator.unique_id)
+        ids = np.flatnonzero(~np.isnan(row))
+        return list(zip(ids.tolist(), row[ids].tolist()))
+
+    def knownIds(self):
+        return self.bcTree.nodes()
+
+    def orphanIds(self):
+        return [blkid for blkid, flag in enumerate(self.orphan) if flag]
+
+    def addOrphan(self, block):
+        '''
+        Keep a block whose parent is not known yet, evicting the oldest orphans above the cap.
+        '''
+        growTo(self.orphan, block.id + 1, 0)
+        self.orphan[block.id] = 1
+        self.num_orphans += 1
+        self.orphans_by_parent.setdefault(block.pblkid, []).append(block)
+        if self.max_orphans is None:
+            return
+        self.orphan_queue.append(block.id)
+        while self.num_orphans > self.max_orphans:
+            blkid = self.orphan_queue.popleft()
+            # ids of orphans that connected meanwhile are skipped
+            if self.isOrphan(blkid):
+                self.evictOrphan(blkid)
+
+    def evictOrphan(self, blkid):
+        '''
+        Drop an orphan that never connected, it is accepted again if it is received later.
+        '''
+        block = self.creator.ctx.blocks[blkid]
+        self.orphan[blkid] = 0
+        self.num_orphans -= 1
+        siblings = self.orphans_by_parent[block.pblkid]
+        siblings.remove(block)
+        if not siblings:
+            del self.orphans_by_parent[block.pblkid]
+        self.arrivals.clear(self.creator.unique_id, blkid)
+        self.orphans_evicted += 1
+
+    def popOrphans(self, pblkid):
+        '''
+        Remove and return the orphans waiting on the block pblkid.
+        '''
+        children = self.orphans_by_parent.pop(pblkid, ())
+        for child in children:
+            self.orphan[child.id] = 0
+        self.num_orphans -= len(children)
+        return children
 
 
     
@@ -233,16 +463,12 @@ class BlockChain:
 
 
 # a class called Transaction.
-txID = 10
 class Transaction:
     '''
     Transaction class to represent the transaction in the network.
     '''
-    def __init__(self, peer1=None, peer2=None, amount=None, timestamp=None, is_coinbase=False):
-        # self.txid = txid #Transaction ID
-        global txID
-        self.txid = txID
-        txID += 1 
+    def __init__(self, ctx, peer1=None, peer2=None, amount=None, timestamp=None, is_coinbase=False):
+        self.txid = ctx.nextTxId() #Transaction ID
         self.peer1 = peer1 #Peer which is paying.
         self.peer2 = peer2 #Peer which is receiving.
         self.amount = amount #Amount transferred from Peer1 to Peer2.
@@ -261,9 +487,13 @@ class Transaction:
 class Event:
     '''
     Event class to simulate the event Loop in BlockChain Network 
-    
+    event_type is one of the integer codes TX_GEN, TX_REC, BLK_GEN, BLK_REC, INV_REC, GETDATA_REC.
+    An INV_REC or GETDATA_REC carries either txn or block.
+    Slotted since tens of millions of these are allocated per run.
     '''
-    def __init__(self, timestamp, event_type, sender=None, receiver=None, generator = None,  txn=None, block=None, blockID=None):
+    __slots__ = ("timestamp", "event_type", "sender", "receiver", "generator", "txn", "block")
+
+    def __init__(self, timestamp, event_type, sender=None, receiver=None, generator = None,  txn=None, block=None):
         self.timestamp = timestamp
         self.event_type = event_type
         self.txn = txn
@@ -271,10 +501,8 @@ class Event:
         self.sender = sender
         self.receiver = receiver
         self.generator = generator
-        self.blockID = blockID
 
 
-blockId = 1
 class Block: 
     '''
     Block class to represent the block in the network.
@@ -283,32 +511,85 @@ class Block:
     length : Length of the block.
     vtime : Virtual time of the block.
     pblkid : Parent block ID of the block.
+    pblk : Parent block of the block.
     creator : Creator of the block.
     txns : List of transactions in the block.
-    balances : List of balances of upto the Block in the blockchain.
+    txids : Array of the txids of the transactions after the coinbase, sent as short ids by compact relay.
+    delta_ids, delta_vals : Sorted ids of the peers touched by the transactions of the block and the net change of their balance.
+    snapshot : Read only array of the balances upto the Block, only kept by the genesis block and every
+               balanceCheckpoint-th block, other balances are rebuilt from the deltas on demand.
     '''
-    def __init__(self, vtime, pblkid, creator, coinbase, txns= None, gen=False, balances = []):
-        global blockId
+    def __init__(self, ctx, vtime, pblkid, creator, coinbase, txns= None, gen=False, balances = []):
+        self.snapshot = None
+        self.delta_ids = np.zeros(0, dtype=np.int64)
+        self.delta_vals = np.zeros(0, dtype=np.int64)
         if gen:
             self.id = 0
             self.length = 1
             self.pblk = None
+            self.snapshot = np.array(balances, dtype=np.int64)
+            self.snapshot.flags.writeable = False
         else:
-            print("Block ID: ", blockId, " Parent Block ID: ", creator.blockchain.id2blk[pblkid].id, " created by Peer_" + str(creator.unique_id))
-            self.id = blockId 
-            self.length = creator.blockchain.id2blk[pblkid].length + 1
-            blockId += 1   
-            self.pblk = creator.blockchain.id2blk[pblkid]
+            print("Block ID: ", ctx.blockId, " Parent Block ID: ", ctx.blocks[pblkid].id, " created by Peer_" + str(creator.unique_id))
+            self.id = ctx.nextBlockId()
+            self.pblk = ctx.blocks[pblkid]
+            self.length = self.pblk.length + 1
+            self.delta_ids = np.array([creator.unique_id], dtype=np.int64)
+            self.delta_vals = np.array([coinbase.amount], dtype=np.int64)
         self.vtime = vtime
         self.pblkid = pblkid
         self.creator = creator
         self.txns = []
         self.txns.append(coinbase)
-        # make a deep copy of the balances of the parent block
-        self.balances = balances.copy()
-        
-
-def total_blocks():
-    return blockId
-
+        self.txids = np.zeros(0, dtype=np.int64)
+        ctx.blocks.add(self)
 
+    def setTxns(self, txns):
+        '''
+        Add the transactions after the coinbase and checkpoint the full balances every balanceCheckpoint blocks.
+        '''
+        self.txns.extend(txns)
+        self.txids = np.fromiter((txn.txid for txn in txns), dtype=np.int64, count=len(txns))
+        self.delta_ids, self.delta_vals = netDeltas(*txnArrays(self.txns))
+        if self.length % balanceCheckpoint == 0:
+            self.snapshot = self.balances
+            self.snapshot.flags.writeable = False
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.snapshot is not None:
+            self.snapshot.flags.writeable = False
+
+    def balancesAt(self, ids):
+        '''
+        Balances of the peers in ids upto this Block, walks back at most balanceCheckpoint blocks.
+        '''
+        ids = np.asarray(ids, dtype=np.int64)
+        balances = np.zeros(len(ids), dtype=np.int64)
+        block = self
+        while block.snapshot is None:
+            if len(block.delta_ids):
+                pos = np.searchsorted(block.delta_ids, ids)
+                pos[pos == len(block.delta_ids)] = 0
+                hit = block.delta_ids[pos] == ids
+                balances[hit] += block.delta_vals[pos[hit]]
+            block = block.pblk
+        return balances + block.snapshot[ids]
+
+    def balanceOf(self, peer_id):
+        return int(self.balancesAt([peer_id])[0])
+
+    @property
+    def balances(self):
+        '''
+        Array of balances of upto the Block in the blockchain, materialised from the nearest snapshot.
+        '''
+        chain = []
+        block = self
+        while block.snapshot is None:
+            chain.append(block)
+            block = block.pblk
+        balances = block.snapshot.copy()
+        for blk in chain:
+            np.add.at(balances, blk.delta_ids, blk.delta_vals)
+        return balances
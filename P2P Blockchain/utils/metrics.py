@@ -0,0 +1,86 @@
+from array import array
+
+
+class ChainMetrics:
+    '''
+    Chain quality counters kept up to date every time a peer switches its longest chain, so the
+    metrics cost O(peers) to report and can be read in the middle of a run.
+    When the tip of a chain moves, the blocks between the old tip and the fork point are taken off the counters
+    and the blocks from the fork point to the new tip are added, which is one block unless the chain is reorganised.
+    Contains the following attributes:
+    tips : Block id of the tip of the longest chain of every peer.
+    own : Number of blocks created by every peer that are in its own longest chain.
+    watched : unique_ids of the creators whose blocks are counted on the chain of every peer, the selfish miners.
+    watched_in_chain : For every peer, the number of blocks of each watched creator on its longest chain.
+    canonical : Tip of the longest chain over all the peers, the first peer to reach a length sets it.
+    canonical_creators : Number of blocks of every creator on the canonical chain.
+    reorgs, max_reorg : Number of tip switches that dropped blocks, and the most blocks dropped by one.
+    '''
+
+    def __init__(self, store, n, watched = ()):
+        self.store = store
+        self.tips = array('i', [0]) * n
+        self.own = array('i', [0]) * n
+        self.watched = list(watched)
+        self.watch_index = {creator: k for k, creator in enumerate(self.watched)}
+        self.watched_in_chain = [array('i', [0]) * len(self.watched) for _ in range(n)]
+        self.canonical = 0
+        self.canonical_creators = array('i', [0]) * n
+        self.reorgs = 0
+        self.max_reorg = 0
+
+    def path(self, old, new):
+        '''
+        Blocks leaving and entering the chain when its tip moves from old to new.
+        '''
+        parent = self.store.parent
+        height = self.store.height
+        removed = []
+        added = []
+        while height[new] > height[old]:
+            added.append(new)
+            new = parent[new]
+        while height[old] > height[new]:
+            removed.append(old)
+            old = parent[old]
+        while old != new:
+            removed.append(old)
+            added.append(new)
+            old = parent[old]
+            new = parent[new]
+        return removed, added
+
+    def switchTip(self, peer_id, blkid):
+        '''
+        Peer peer_id moved the tip of its longest chain to blkid.
+        '''
+        removed, added = self.path(self.tips[peer_id], blkid)
+        self.tips[peer_id] = blkid
+        if removed:
+            self.reorgs += 1
+            self.max_reorg = max(self.max_reorg, len(removed))
+        creator = self.store.creator
+        watch_index = self.watch_index
+        in_chain = self.watched_in_chain[peer_id]
+        for blocks, step in ((removed, -1), (added, 1)):
+            for block in blocks:
+                mined_by = creator[block]
+                if mined_by == peer_id:
+                    self.own[peer_id] += step
+                k = watch_index.get(mined_by)
+                if k is not None:
+                    in_chain[k] += step
+
+        if self.store.height[blkid] > self.store.height[self.canonical]:
+            removed, added = self.path(self.canonical, blkid)
+            self.canonical = blkid
+            for block in removed:
+                self.canonical_creators[creator[block]] -= 1
+            for block in added:
+                self.canonical_creators[creator[block]] += 1
+
+    def longestChain(self):
+        '''
+        Length of the canonical chain including the genesis block.
+        '''
+        return self.store.height[self.canonical] + 1
@@ -0,0 +1,97 @@
+import os
+import queue
+import threading
+
+
+class OutputWriter:
+    '''
+    Background writer for all the observation files.
+    write() collects records in a local batch which is handed to a bounded queue, a daemon thread
+    drains the queue and writes each file once per batch through one buffered handle per file.
+    The thread is started on the first write, close() flushes and closes every handle.
+    Pickling the writer flushes it and keeps the size of every file written, unpickling truncates
+    the files back to those sizes, so the lines written after a checkpoint are not repeated on resume.
+    '''
+
+    def __init__(self, batch_size = 4096, max_batches = 64, buffering = 1 << 20):
+        self.batch_size = batch_size
+        self.buffering = buffering
+        self.records = queue.Queue(max_batches)
+        self.batch = []
+        self.handles = {}
+        self.paths = set()
+        self.thread = None
+        self.error = None
+
+    def write(self, path, text):
+        '''
+        Append text to the file at path.
+        '''
+        self.batch.append((path, text))
+        if len(self.batch) >= self.batch_size:
+            self.submit()
+
+    def submit(self):
+        if not self.batch:
+            return
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="OutputWriter", daemon=True)
+            self.thread.start()
+        self.records.put(self.batch)
+        self.batch = []
+
+    def run(self):
+        while True:
+            batch = self.records.get()
+            if batch is None:
+                break
+            if self.error is not None:
+                # keep draining so the simulation never blocks, close() raises the error
+                continue
+            try:
+                self.writeBatch(batch)
+            except Exception as e:
+                self.error = e
+
+    def writeBatch(self, batch):
+        # group the records by file so every file gets one large write per batch
+        grouped = {}
+        for path, text in batch:
+            if path in grouped:
+                grouped[path].append(text)
+            else:
+                grouped[path] = [text]
+        for path, texts in grouped.items():
+            handle = self.handles.get(path)
+            if handle is None:
+                handle = self.handles[path] = open(path, 'a', buffering=self.buffering)
+                self.paths.add(path)
+            handle.write(''.join(texts))
+
+    def close(self):
+        '''
+        Write the pending records, stop the thread and close the handles. The writer can be used again afterwards.
+        '''
+        self.submit()
+        if self.thread is not None:
+            self.records.put(None)
+            self.thread.join()
+            self.thread = None
+        for handle in self.handles.values():
+            handle.close()
+        self.handles = {}
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def __getstate__(self):
+        self.close()
+        sizes = {path: os.path.getsize(path) for path in self.paths if os.path.exists(path)}
+        return {"batch_size": self.batch_size, "max_batches": self.records.maxsize, "buffering": self.buffering, "sizes": sizes}
+
+    def __setstate__(self, state):
+        self.__init__(state["batch_size"], state["max_batches"], state["buffering"])
+        for path, size in state["sizes"].items():
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+            self.paths.add(path)
@@ -0,0 +1,166 @@
+import io
+import time as clock
+from contextlib import contextmanager
+from utils.definitions import EVENT_NAMES
+from utils.scheduler import EventQueue
+
+'''
+Profiling of a simulation run, enabled with --profile.
+While a Profiler is attached to a Simulator, its handler table is replaced by timed wrappers and the
+EventList by a ProfiledEventQueue counting pushes, pops and the peak length of the queue. Both are put back
+on detach, so a run that is not profiled goes through exactly the same code as before.
+With cprofile the run is also profiled by cProfile, the stats are written next to the summary as a .prof file.
+'''
+
+# peer method doing the work of the handler of each event code
+HANDLED_BY = ("createTransaction", "receiveTransaction", "createBlock", "receiveBlock", "receiveInv", "receiveGetData")
+
+
+def plainQueue(queue):
+    return queue
+
+
+class ProfiledEventQueue(EventQueue):
+    '''
+    EventQueue working on the heap of another queue and counting what goes through it.
+    It pickles as the queue it wraps, so checkpoints saved while profiling hold a plain EventQueue.
+    '''
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.pushes = 0
+        self.pops = 0
+        self.peak = len(queue.heap)
+
+    @property
+    def heap(self):
+        return self.queue.heap
+
+    @property
+    def seq(self):
+        return self.queue.seq
+
+    @seq.setter
+    def seq(self, seq):
+        self.queue.seq = seq
+
+    def push(self, timestamp, event):
+        super().push(timestamp, event)
+        self.pushes += 1
+        if len(self.queue.heap) > self.peak:
+            self.peak = len(self.queue.heap)
+
+    def push_many(self, entries):
+        entries = list(entries)
+        super().push_many(entries)
+        self.pushes += len(entries)
+        if len(self.queue.heap) > self.peak:
+            self.peak = len(self.queue.heap)
+
+    def pop(self):
+        self.pops += 1
+        return super().pop()
+
+    def __reduce__(self):
+        return (plainQueue, (self.queue,))
+
+
+class Profiler:
+    '''
+    Counts and cumulative time of the handlers by event code, the queue counters and the wall time of the
+    profiled part of the run. Attaching the same Profiler again, e.g. to a resumed run, adds to its totals.
+    '''
+
+    def __init__(self, cprofile = False):
+        self.counts = [0] * len(EVENT_NAMES)
+        self.times = [0.0] * len(EVENT_NAMES)
+        self.pushes = 0
+        self.pops = 0
+        self.peak = 0
+        self.wall_time = 0.0
+        self.cprofile = None
+        if cprofile:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+        self.queue = None
+        self.handlers = None
+        self.started = None
+
+    def timed(self, event_type, handler):
+        counts = self.counts
+        times = self.times
+        perf_counter = clock.perf_counter
+
+        def timedHandler(event, *args):
+            start = perf_counter()
+            try:
+                return handler(event, *args)
+            finally:
+                times[event_type] += perf_counter() - start
+                counts[event_type] += 1
+        return timedHandler
+
+    def attach(self, sim):
+        self.handlers = sim.handlers
+        sim.handlers = tuple(self.timed(event_type, handler) for event_type, handler in enumerate(sim.handlers))
+        self.queue = ProfiledEventQueue(sim.ctx.EventList)
+        sim.ctx.EventList = self.queue
+        self.peak = max(self.peak, self.queue.peak)
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        self.started = clock.perf_counter()
+
+    def detach(self, sim):
+        self.wall_time += clock.perf_counter() - self.started
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        sim.handlers = self.handlers
+        sim.ctx.EventList = self.queue.queue
+        self.pushes += self.queue.pushes
+        self.pops += self.queue.pops
+        self.peak = max(self.peak, self.queue.peak)
+        self.queue = None
+        self.handlers = None
+
+    @contextmanager
+    def profile(self, sim):
+        '''
+        Profile everything sim does inside the with block.
+        '''
+        self.attach(sim)
+        try:
+            yield self
+        finally:
+            self.detach(sim)
+
+    def summary(self, top = 25):
+        '''
+        Lines of text of the profile, with the top functions by own time when cProfile was on and top is not 0.
+        '''
+        events = sum(self.counts)
+        handled = sum(self.times)
+        lines = [f"Profiled wall time: {self.wall_time:.3f} s, events: {events}, "
+                 f"{events / self.wall_time if self.wall_time else 0:.0f} events/s"]
+        lines.append(f"{'event':<16}{'handled by':<20}{'count':>10}{'total s':>10}{'mean us':>10}{'share':>8}")
+        for event_type, name in enumerate(EVENT_NAMES):
+            count, total = self.counts[event_type], self.times[event_type]
+            mean = total / count * 1e6 if count else 0.0
+            share = total / self.wall_time if self.wall_time else 0.0
+            lines.append(f"{name:<16}{HANDLED_BY[event_type]:<20}{count:>10}{total:>10.3f}{mean:>10.1f}{share:>8.1%}")
+        lines.append(f"Outside the handlers (queue, stop conditions, event output, checkpoints): {self.wall_time - handled:.3f} s")
+        lines.append(f"EventList: {self.pushes} pushes, {self.pops} pops, peak length {self.peak}")
+        if self.cprofile is not None and top:
+            import pstats
+            stream = io.StringIO()
+            pstats.Stats(self.cprofile, stream=stream).sort_stats("tottime").print_stats(top)
+            lines.append(stream.getvalue())
+        return lines
+
+    def save(self, path):
+        '''
+        Write the summary to path + '.txt', and the cProfile stats to path + '.prof' (snakeviz, pstats).
+        '''
+        with open(path + '.txt', 'w') as f:
+            f.write("\n".join(self.summary()) + "\n")
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(path + '.prof')
@@ -0,0 +1,91 @@
+import os
+from multiprocessing import Pool
+
+'''
+Drawing of the blockchains of the peers, selected with --render:
+none : nothing is drawn
+dot  : ./observations/BlockChains/bc_<peer>.dot is written for every peer, without any layout, the
+       files can be turned into images later with graphviz (flow.sh)
+png  : the .dot files and a bc_<peer>.png drawn with matplotlib, the layouts and images of the peers
+       are made in a process pool
+A job is the (peer_id, edges, labels, colors) of one peer, small plain data so it is cheap to send to
+a worker. matplotlib uses the Agg backend and every figure is closed once saved.
+'''
+
+RENDER_MODES = ("none", "dot", "png")
+FOLDER = './observations/BlockChains'
+
+
+def dotText(edges, labels, colors = None):
+    '''
+    DOT source of a block tree, the nodes are named by their labels as write_dot did.
+    '''
+    colors = colors or {}
+    lines = ['strict digraph {']
+    for node, color in colors.items():
+        lines.append(f'"{labels[node]}" [color={color}];')
+    for parent, child in edges:
+        lines.append(f'"{labels[parent]}" -> "{labels[child]}";')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def writeDot(job):
+    peer_id, edges, labels, colors = job
+    with open(f'{FOLDER}/bc_{peer_id}.dot', 'w') as f:
+        f.write(dotText(edges, labels, colors))
+
+
+def treeLayout(graph):
+    '''
+    Positions of the blocks, a graphviz dot layout when pygraphviz is installed,
+    otherwise one row per height of the tree.
+    '''
+    import networkx as nx
+    try:
+        from networkx.drawing.nx_agraph import graphviz_layout
+        return graphviz_layout(graph, prog="dot")
+    except ImportError:
+        root = min(graph.nodes())
+        for node, depth in nx.shortest_path_length(graph, root).items():
+            graph.nodes[node]["depth"] = -depth
+        return nx.multipartite_layout(graph, subset_key="depth", align="horizontal")
+
+
+def drawPng(job):
+    '''
+    Lay out and save the tree of one peer, run in the workers of renderChains.
+    '''
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import networkx as nx
+    peer_id, edges, labels, colors = job
+    graph = nx.DiGraph()
+    graph.add_nodes_from(labels)
+    graph.add_edges_from(edges)
+    node_color = [colors.get(node, '#1f78b4') for node in graph.nodes()] if colors else '#1f78b4'
+    fig = plt.figure()
+    nx.draw(graph, treeLayout(graph), with_labels=True, labels=labels, node_color=node_color)
+    fig.savefig(f'{FOLDER}/bc_{peer_id}.png')
+    plt.close(fig)
+
+
+def renderChains(jobs, mode = "png", workers = None):
+    '''
+    Write the .dot files of jobs, and with mode png draw them over a pool of workers (all the cpus by default).
+    '''
+    if mode == "none":
+        return
+    for job in jobs:
+        writeDot(job)
+    if mode != "png":
+        return
+    workers = min(workers or os.cpu_count(), len(jobs))
+    if workers <= 1:
+        for job in jobs:
+            drawPng(job)
+        return
+    with Pool(workers) as pool:
+        for _ in pool.imap_unordered(drawPng, jobs):
+            pass
@@ -0,0 +1,241 @@
+import argparse
+import os
+import struct
+import numpy as np
+from utils.definitions import TX_GEN, TX_REC, BLK_GEN, BLK_REC, INV_REC, EVENT_NAMES, itemKey
+
+'''
+Compact binary trace of the simulated events.
+Every event is appended as one fixed width record (timestamp, type, sender, receiver, item) to the trace file,
+item is the txid of a Transaction_Rec and the block id of a Block_Rec, -1 otherwise.
+An Inv_Rec or GetData_Rec stores definitions.itemKey of the announced item, the txid or -1 - block id.
+Transactions are stored once in a side table <trace>.txns so the legacy text files can be regenerated.
+TraceReader memory maps both files as NumPy structured arrays.
+
+Usage:
+python -m utils.trace <trace> summary
+python -m utils.trace <trace> blocks <block_id>
+python -m utils.trace <trace> rate [--bin 1000] [--type Block_Rec] [-o rate.csv]
+python -m utils.trace <trace> text [--folder ./observations/Events]
+'''
+
+EVENT_DTYPE = np.dtype([('timestamp', '<f8'), ('type', 'u1'), ('sender', '<i4'), ('receiver', '<i4'), ('item', '<i8')])
+TXN_DTYPE = np.dtype([('txid', '<i8'), ('payer', '<i4'), ('payee', '<i4'), ('amount', '<i8')])
+EVENT_RECORD = struct.Struct('<dBiiq')
+TXN_RECORD = struct.Struct('<qiiq')
+CHUNK = 1 << 20
+
+
+class TraceWriter:
+    '''
+    Appends event and transaction records to the trace files through large buffered handles.
+    A closed writer is reopened in append mode by open(), so a stopped run can be continued.
+    Pickling keeps the length of both files, unpickling truncates them back to it.
+    '''
+
+    def __init__(self, path, buffering = 1 << 20):
+        self.path = path
+        self.buffering = buffering
+        self.events = None
+        self.txns = None
+        self.packEvent = EVENT_RECORD.pack
+        self.packTxn = TXN_RECORD.pack
+        self.open('wb')
+
+    def open(self, mode = 'ab'):
+        if self.events is not None and not self.events.closed:
+            return
+        self.events = open(self.path, mode, buffering=self.buffering)
+        self.txns = open(self.path + '.txns', mode, buffering=self.buffering)
+
+    def record(self, event):
+        event_type = event.event_type
+        if event_type == TX_GEN:
+            record = self.packEvent(event.timestamp, event_type, event.sender.unique_id, -1, -1)
+        elif event_type == TX_REC:
+            record = self.packEvent(event.timestamp, event_type, event.sender.unique_id, event.receiver.unique_id, event.txn.txid)
+        elif event_type == BLK_GEN:
+            record = self.packEvent(event.timestamp, event_type, event.generator.unique_id, -1, -1)
+        elif event_type >= INV_REC:
+            record = self.packEvent(event.timestamp, event_type, event.sender.unique_id, event.receiver.unique_id, itemKey(event.txn, event.block))
+        else:
+            record = self.packEvent(event.timestamp, event_type, event.sender.unique_id, event.receiver.unique_id, event.block.id)
+        self.events.write(record)
+
+    def recordTxn(self, txn):
+        self.txns.write(self.packTxn(txn.txid, txn.peer1.unique_id, txn.peer2.unique_id, txn.amount))
+
+    def close(self):
+        self.events.close()
+        self.txns.close()
+
+    def __getstate__(self):
+        if not self.events.closed:
+            self.events.flush()
+            self.txns.flush()
+        sizes = (os.path.getsize(self.path), os.path.getsize(self.path + '.txns'))
+        return {"path": self.path, "buffering": self.buffering, "sizes": sizes}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self.buffering = state["buffering"]
+        self.events = None
+        self.txns = None
+        self.packEvent = EVENT_RECORD.pack
+        self.packTxn = TXN_RECORD.pack
+        for path, size in zip((self.path, self.path + '.txns'), state["sizes"]):
+            if os.path.getsize(path) > size:
+                os.truncate(path, size)
+        self.open('ab')
+
+
+def mapFile(path, dtype):
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
+class TraceReader:
+    '''
+    Read only view of a trace, queries run over the memory map in chunks so a trace larger than memory can be analysed.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.events = mapFile(path, EVENT_DTYPE)
+        self.txns = mapFile(path + '.txns', TXN_DTYPE)
+
+    def __len__(self):
+        return len(self.events)
+
+    def chunks(self):
+        for start in range(0, len(self.events), CHUNK):
+            yield self.events[start:start + CHUNK]
+
+    def numPeers(self):
+        n = 0
+        for chunk in self.chunks():
+            n = max(n, int(chunk['sender'].max()) + 1, int(chunk['receiver'].max()) + 1)
+        return n
+
+    def select(self, event_type = None, peer = None, item = None):
+        '''
+        Return the records matching every given filter, peer matches either the sender or the receiver.
+        '''
+        selected = []
+        for chunk in self.chunks():
+            mask = np.ones(len(chunk), dtype=bool)
+            if event_type is not None:
+                mask &= chunk['type'] == event_type
+            if peer is not None:
+                mask &= (chunk['sender'] == peer) | (chunk['receiver'] == peer)
+            if item is not None:
+                mask &= chunk['item'] == item
+            selected.append(chunk[mask])
+        if not selected:
+            return np.empty(0, dtype=EVENT_DTYPE)
+        return np.concatenate(selected)
+
+    def blockReceptions(self, block_id):
+        '''
+        All the Block_Rec events of block_id, in time order.
+        '''
+        return self.select(BLK_REC, item=block_id)
+
+    def countsByType(self):
+        counts = np.zeros(len(EVENT_NAMES), dtype=np.int64)
+        for chunk in self.chunks():
+            counts += np.bincount(chunk['type'], minlength=len(EVENT_NAMES))
+        return dict(zip(EVENT_NAMES, counts.tolist()))
+
+    def eventsPerPeer(self, bin = 1000.0, event_type = None):
+        '''
+        Matrix of event counts, rows are peers and columns are time bins of width bin (the latencies are in msec).
+        An event is counted at the peer handling it, the receiver for *_Rec and the sender for *_Gen.
+        '''
+        if len(self.events) == 0:
+            return np.zeros((0, 0), dtype=np.int64)
+        n = self.numPeers()
+        nbins = int(self.events[-1]['timestamp'] // bin) + 1
+        counts = np.zeros(n * nbins, dtype=np.int64)
+        for chunk in self.chunks():
+            if event_type is not None:
+                chunk = chunk[chunk['type'] == event_type]
+            peer = np.where(chunk['receiver'] >= 0, chunk['receiver'], chunk['sender']).astype(np.int64)
+            bins = (chunk['timestamp'] // bin).astype(np.int64)
+            counts += np.bincount(peer * nbins + bins, minlength=n * nbins)
+        return counts.reshape(n, nbins)
+
+    def toText(self, folder = './observations/Events'):
+        '''
+        Regenerate the legacy per peer text files of Simulator.outputEvent.
+        '''
+        os.makedirs(folder, exist_ok=True)
+        order = np.argsort(self.txns['txid'], kind='stable')
+        txids = self.txns['txid'][order]
+        handles = {}
+        try:
+            for chunk in self.chunks():
+                lines = {}
+                rows = np.searchsorted(txids, chunk['item'])
+                for record, row in zip(chunk.tolist(), rows.tolist()):
+                    timestamp, event_type, sender, receiver, item = record
+                    if event_type == TX_GEN:
+                        peer = sender
+                        line = f"{timestamp} {EVENT_NAMES[event_type]} sender = {sender}  \n"
+                    elif event_type == TX_REC:
+                        peer = receiver
+                        txn = self.txns[order[row]]
+                        line = f"{timestamp} {EVENT_NAMES[event_type]} {receiver} {item} {txn['amount']} Transaction from {txn['payer']} to {txn['payee']} \n"
+                    elif event_type == BLK_GEN:
+                        peer = sender
+                        line = f"{timestamp} {EVENT_NAMES[event_type]} {sender} \n"
+                    elif event_type >= INV_REC:
+                        peer = receiver
+                        item = f"Transaction {item}" if item >= 0 else f"Block {-1 - item}"
+                        line = f"{timestamp} {EVENT_NAMES[event_type]} {receiver} {item} from {sender} \n"
+                    else:
+                        peer = receiver
+                        line = f"{timestamp} {EVENT_NAMES[event_type]} {receiver} {item} \n"
+                    lines.setdefault(peer, []).append(line)
+                for peer, texts in lines.items():
+                    if peer not in handles:
+                        handles[peer] = open(f'{folder}/peer_{peer}.txt', 'w')
+                    handles[peer].write(''.join(texts))
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Query a binary event trace')
+    parser.add_argument('trace', help='trace file written with main.py --trace')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('summary', help='number of events of each type')
+    blocks = commands.add_parser('blocks', help='all Block_Rec events of a block')
+    blocks.add_argument('block_id', type=int)
+    rate = commands.add_parser('rate', help='events per peer per time bin')
+    rate.add_argument('--bin', default=1000.0, type=float, help='width of a time bin')
+    rate.add_argument('--type', default=None, choices=EVENT_NAMES, help='only count this event type')
+    rate.add_argument('-o', '--output', default=None, help='save the matrix as CSV')
+    text = commands.add_parser('text', help='regenerate the legacy per peer text files')
+    text.add_argument('--folder', default='./observations/Events')
+    args = parser.parse_args()
+
+    reader = TraceReader(args.trace)
+    if args.command == 'summary':
+        print(f"{len(reader)} events, {len(reader.txns)} transactions")
+        for name, count in reader.countsByType().items():
+            print(f"{name}: {count}")
+    elif args.command == 'blocks':
+        for timestamp, _, sender, receiver, _ in reader.blockReceptions(args.block_id).tolist():
+            print(f"{timestamp} Peer_{receiver} from Peer_{sender}")
+    elif args.command == 'rate':
+        event_type = None if args.type is None else EVENT_NAMES.index(args.type)
+        counts = reader.eventsPerPeer(args.bin, event_type)
+        if args.output:
+            np.savetxt(args.output, counts, fmt='%d', delimiter=',')
+        else:
+            print(counts)
+    elif args.command == 'text':
+        reader.toText(args.folder)